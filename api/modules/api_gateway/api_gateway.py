@@ -25,17 +25,11 @@ def api_gateway_stop() -> Dict[str, Any]:
 
 @register_api(name="api_gateway.info", outputs=["info"], description="获取API网关信息")
 def api_gateway_info(config_file: Optional[str] = None) -> Dict[str, Any]:
-    gateway = get_api_gateway(config_file=config_file)
-    return {
-        "endpoints": len(gateway.router.get_endpoints()),
-        "middlewares": len(gateway.router.get_middlewares()),
-        "websocket_connections": len(gateway.websocket_connections),
-        "config": gateway.config.__dict__ if gateway.config else None
-    }
+    return get_api_gateway(config_file=config_file).info_snapshot()
 
 
 @register_api(name="api_gateway.broadcast", outputs=["result"], description="向所有WebSocket连接广播消息")
 async def api_gateway_broadcast(message: Dict[str, Any]) -> Dict[str, Any]:
     gateway = get_api_gateway()
-    await gateway.broadcast_message(message)
+    await gateway.broadcast_message_threadsafe(message)
     return {"broadcasted": True, "connections": len(gateway.websocket_connections)}
\ No newline at end of file
@@ -230,7 +230,12 @@ class APIClient {
         this.websocket.onmessage = (event) => {
             try {
                 const data = JSON.parse(event.data);
-                this.handleWebSocketMessage(data);
+                // 服务端开启发送合并时，一帧可能包含多条消息
+                if (Array.isArray(data)) {
+                    data.forEach(item => this.handleWebSocketMessage(item));
+                } else {
+                    this.handleWebSocketMessage(data);
+                }
             } catch (error) {
                 console.error('WebSocket消息解析失败:', error);
             }
@@ -9,6 +9,7 @@ from .api_gateway_module import (
     APIGateway,
     APIRouter,
     Middleware,
+    CoreMiddleware,
     GatewayConfig,
     get_api_gateway,
     create_api_gateway_for_project
@@ -19,6 +20,7 @@ __all__ = [
     "APIGateway",
     "APIRouter",
     "Middleware",
+    "CoreMiddleware",
     "GatewayConfig",
     "get_api_gateway",
     "create_api_gateway_for_project"
@@ -6,21 +6,42 @@ API网关模块
 该模块不再硬编码任何配置，所有配置都从项目配置文件中读取。
 """
 
+import os
+import re
+import sys
+import bisect
 import json
+import time
+import typing
 import asyncio
+import inspect
 import logging
-from typing import Any, Dict, List, Optional, Callable, Union
-from dataclasses import dataclass, field
+import functools
+import contextlib
+import contextvars
+import weakref
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Callable, Set, Tuple, Union, get_origin, get_args
+from dataclasses import dataclass, field, asdict
 from pathlib import Path
 from datetime import datetime
+import socket
 import threading
 
 try:
     from fastapi import FastAPI, HTTPException, Request, Response, WebSocket
+    from fastapi.encoders import jsonable_encoder
     from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.middleware.gzip import GZipMiddleware
     from fastapi.responses import JSONResponse
     from fastapi.staticfiles import StaticFiles
     from fastapi.websockets import WebSocketDisconnect
+    from starlette.concurrency import run_in_threadpool
+    from starlette.datastructures import UploadFile
+    from starlette.middleware import Middleware as ASGIMiddleware
+    from starlette.middleware.base import BaseHTTPMiddleware
+    from starlette.routing import Route
     from starlette.websockets import WebSocketState
     import uvicorn
 except ImportError:
@@ -29,6 +50,21 @@ except ImportError:
     WebSocketState = None
     print("⚠️ FastAPI未安装，请运行: pip install fastapi uvicorn")
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 from core.api_registry import register_api, get_registered_api, get_registry
 from core.services import get_service_manager
 
@@ -36,8 +72,250 @@ from core.services import get_service_manager
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 多进程模式下传递网关配置的环境变量
+_WORKER_CONFIG_ENV = "MODULARFLOW_GATEWAY_CONFIG"
+
+# 当前调用来自网关自身的HTTP请求（随上下文传入线程池）：此时停止服务器不能等待服务器线程，
+# 否则服务器会在响应发出前退出
+_IN_GATEWAY_CALL = contextvars.ContextVar("in_gateway_call", default=False)
+
+# WebSocket 固定格式帧的预生成片段，仅需拼接可变字段
+_WS_ERROR_PREFIX = '{"type":"error","error":"消息处理失败","detail":'
+_WS_PONG_PREFIX = '{"type":"pong","timestamp":'
+
+
+def _json_default(obj: Any) -> Any:
+    """JSON序列化的兜底转换（日期、路径、集合等）"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, Path):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# orjson 选项：与标准库行为对齐（允许非字符串键），并直接支持 numpy 数组
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+
+
+def _dumps_bytes(obj: Any) -> bytes:
+    """序列化为JSON字节串（优先使用 orjson）"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_json_default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, ensure_ascii=False, default=_json_default).encode("utf-8")
+
+
+def _dumps_text(obj: Any) -> str:
+    """序列化为JSON文本（WebSocket 文本帧使用，前端按文本解析）"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_json_default, option=_ORJSON_OPTIONS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, default=_json_default)
+
+
+def _loads(data: Union[str, bytes]) -> Any:
+    """解析JSON文本或字节串（优先使用 orjson）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# 默认JSON响应类：经 _dumps_bytes 渲染，安装了 orjson 时即为 orjson 编码；
+# 遇到快速路径无法编码的类型（bytes、Decimal、pydantic 模型、超过64位的整数等）
+# 时回退到 jsonable_encoder + 标准 JSONResponse，与 FastAPI 默认行为一致
+if FastAPI is not None:
+    class DefaultJSONResponse(JSONResponse):
+        def render(self, content: Any) -> bytes:
+            try:
+                return _dumps_bytes(content)
+            except (TypeError, ValueError, OverflowError):
+                return super().render(jsonable_encoder(content))
+else:
+    DefaultJSONResponse = None
+
+
+def _packb(obj: Any) -> bytes:
+    """MessagePack 编码（协商了 msgpack 子协议的 WebSocket 连接使用）"""
+    return msgpack.packb(obj, default=_json_default, use_bin_type=True)
+
+
+def _resolve_ws_impl(name: str) -> str:
+    """校验 uvicorn 是否支持指定的 WebSocket 实现且其依赖已安装，否则回退到 auto"""
+    try:
+        from uvicorn.config import WS_PROTOCOLS
+    except ImportError:
+        return "auto"
+    if name not in WS_PROTOCOLS:
+        logger.warning(f"⚠️ uvicorn 不支持 WebSocket 实现 {name}，回退到 auto")
+        return "auto"
+    library = "wsproto" if name == "wsproto" else "websockets" if name.startswith("websockets") else None
+    if library:
+        try:
+            __import__(library)
+        except ImportError:
+            logger.warning(f"⚠️ WebSocket 实现 {name} 需要安装 {library}，回退到 auto")
+            return "auto"
+    return name
+
+
+def _resolve_optional_impl(module_name: str) -> str:
+    """已安装可选加速库（uvloop/httptools）时返回其名称，否则交由 uvicorn 自动选择"""
+    try:
+        __import__(module_name)
+    except ImportError:
+        return "auto"
+    return module_name
+
+
+# camelCase -> snake_case 转换缓存（API字段名集合很小，命中后即为一次字典查找）
+_SNAKE_CACHE: Dict[str, str] = {}
+_SNAKE_CACHE_MAX = 1024
+_CAMEL_BOUNDARY = re.compile(r'(?<!^)(?=[A-Z])')
+
+
+def _to_snake(s: str) -> str:
+    """camelCase -> snake_case"""
+    r = _SNAKE_CACHE.get(s)
+    if r is None:
+        r = _CAMEL_BOUNDARY.sub('_', s).lower()
+        # 防止任意客户端键名撑大缓存
+        if len(_SNAKE_CACHE) < _SNAKE_CACHE_MAX:
+            _SNAKE_CACHE[s] = r
+    return r
+
+
+def _to_camel(s: str) -> str:
+    """snake_case -> camelCase"""
+    head, *rest = s.split('_')
+    return head + ''.join(part.title() for part in rest)
+
 
-@dataclass
+@functools.lru_cache(maxsize=32)
+def _load_json_cached(path: str, mtime_ns: int) -> Any:
+    """按 (路径, 修改时间) 缓存解析结果；文件修改后自动失效。返回值为共享对象，调用方只读"""
+    return _loads(Path(path).read_bytes())
+
+
+def _load_json_file(path: Path) -> Any:
+    """读取JSON配置文件（带缓存）"""
+    return _load_json_cached(str(path.resolve()), path.stat().st_mtime_ns)
+
+
+class _BodyTooLarge(Exception):
+    """请求体超过 max_body_size"""
+
+
+class _InvalidJSON(Exception):
+    """声明为 application/json 的请求体无法解析"""
+
+
+def _check_content_length(request: "Request", limit: int):
+    """按 Content-Length 预先拒绝超限请求（limit<=0 表示不限制）"""
+    if limit > 0:
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > limit:
+            raise _BodyTooLarge()
+
+
+async def _read_body(request: "Request", limit: int) -> bytes:
+    """流式读取请求体，累计超过上限时立即中止，避免整体缓冲超大请求"""
+    _check_content_length(request, limit)
+    if limit <= 0:
+        return await request.body()
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise _BodyTooLarge()
+    return bytes(body)
+
+
+async def _read_json(request: "Request", limit: int) -> Any:
+    """解析JSON请求体，空请求体视为无参数；非法JSON抛出 _InvalidJSON"""
+    body = await _read_body(request, limit)
+    if not body:
+        return {}
+    try:
+        return _loads(body)
+    except ValueError as e:
+        # 非法JSON（json/orjson 的解码错误均为 ValueError 子类）
+        raise _InvalidJSON(str(e)) from e
+
+
+async def _read_form(request: "Request", limit: int):
+    """
+    解析 multipart 表单，边接收边累计请求体大小
+
+    分块传输（无 Content-Length）的上传同样受 max_body_size 限制，超限时立即中止。
+    """
+    _check_content_length(request, limit)
+    if limit <= 0:
+        return await request.form()
+    receive = request.receive
+    received = 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise _BodyTooLarge()
+        return message
+
+    return await Request(request.scope, limited_receive).form()
+
+
+def _is_optional(annotation: Any) -> bool:
+    """判断类型注解是否为 Optional[...]"""
+    try:
+        return get_origin(annotation) is Union and type(None) in get_args(annotation)
+    except Exception:
+        return False
+
+
+def _is_coroutine_callable(fn: Callable) -> bool:
+    """判断可调用对象是否返回协程（兼容 functools.partial 与实现了 async __call__ 的对象）"""
+    while isinstance(fn, functools.partial):
+        fn = fn.func
+    if inspect.iscoroutinefunction(fn) or asyncio.iscoroutinefunction(fn):
+        return True
+    return inspect.iscoroutinefunction(getattr(type(fn), "__call__", None))
+
+
+def _make_type_validator(expected: Any) -> Optional[Callable[[Any], bool]]:
+    """为类型注解预先生成校验函数；仅处理基础类型与容器，其余注解不做强制"""
+    origin = get_origin(expected)
+    if origin is list:
+        target = list
+    elif origin is dict:
+        target = dict
+    elif expected in (str, int, float, bool, list, dict):
+        target = expected
+    else:
+        # 其余注解（如 Optional/Union/自定义）暂不强制
+        return None
+    return lambda v: isinstance(v, target)
+
+
+def _check_input_types(data: Dict[str, Any], validators: Dict[str, Tuple[Callable[[Any], bool], str]]) -> List[Dict[str, str]]:
+    """按预生成的校验函数检查入参类型"""
+    type_errors = []
+    for k, (is_valid, expected_name) in validators.items():
+        if k in data and not is_valid(data[k]):
+            type_errors.append({
+                "field": k,
+                "expected": expected_name,
+                "actual": type(data[k]).__name__
+            })
+    return type_errors
+
+
+# Python 3.10+ 的 dataclass 支持 slots：去掉实例 __dict__，降低大量端点对象的内存占用
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class APIEndpoint:
     """API端点定义"""
     path: str
@@ -47,9 +325,11 @@ class APIEndpoint:
     summary: str = ""
     description: str = ""
     response_model: Optional[Any] = None
+    # 直接挂载为 Starlette Route：跳过 FastAPI 的参数解析与模型生成，处理器需接收 request 并返回 Response
+    raw: bool = False
 
 
-@dataclass 
+@dataclass(**_DATACLASS_SLOTS)
 class MiddlewareConfig:
     """中间件配置"""
     name: str
@@ -58,17 +338,42 @@ class MiddlewareConfig:
     enabled: bool = True
 
 
-@dataclass
+class _BatchFrame(str):
+    """已是 JSON 数组的合并帧（元素为多条消息），发送合并时展开其元素而不是再嵌套一层"""
+    __slots__ = ()
+
+
+@dataclass(eq=False)
+class WebSocketClient:
+    """WebSocket连接上下文：发送队列由专属写任务串行消费"""
+    websocket: Any
+    queue: asyncio.Queue
+    writer_task: Optional[asyncio.Task] = None
+    # 协商了 msgpack 子协议：收发均为二进制 MessagePack 帧
+    msgpack: bool = False
+
+
+@dataclass(frozen=True, **_DATACLASS_SLOTS)
 class GatewayConfig:
-    """API网关配置"""
+    """API网关配置（不可变，运行中的网关可安全共享同一份配置快照）"""
     # 服务器配置
     host: str = "0.0.0.0"
     port: int = 8050
     debug: bool = True
+    workers: int = 1
+    tcp_nodelay: bool = True
+    # 进程可打开的文件描述符上限（每个 WebSocket 连接占用一个）
+    max_fds: int = 65536
+    # 套接字收发缓冲区（字节），由已接受的连接继承；0 表示保留内核自动调节
+    socket_buffer_size: int = 0
+    # 响应体达到该字节数时启用 gzip 压缩，0 表示关闭
+    gzip_minimum_size: int = 1024
     
     # API配置
     api_prefix: str = "/api"
     auto_discovery: bool = True
+    # 函数API请求体上限（字节），0 表示不限制
+    max_body_size: int = 16 * 1024 * 1024
     
     # 文档配置
     docs_enabled: bool = True
@@ -77,6 +382,27 @@ class GatewayConfig:
     # WebSocket配置
     websocket_enabled: bool = True
     websocket_path: str = "/ws"
+    websocket_weak_tracking: bool = False
+    websocket_send_queue_size: int = 256
+    # 发送合并窗口（毫秒），>0 时将窗口内排队的消息合并为一个 JSON 数组帧
+    websocket_coalesce_ms: float = 0
+    # 最大并发连接数，超出时拒绝新连接；0 表示不限制
+    websocket_max_connections: int = 1000
+    # 允许客户端通过 Sec-WebSocket-Protocol: msgpack 协商二进制编码（需安装 msgpack）
+    websocket_msgpack: bool = True
+    # 单次发送超时（秒），超时视为慢速客户端并断开；0 表示不限制
+    websocket_send_timeout: float = 5.0
+    # uvicorn WebSocket 协议实现（不可用时回退到 auto）、压缩与最大帧大小
+    ws_impl: str = "websockets-sansio"
+    ws_per_message_deflate: bool = True
+    ws_max_size: int = 16 * 1024 * 1024
+    # 跨进程广播（Redis pub/sub），为空时仅广播到本进程连接
+    broadcast_url: str = ""
+    broadcast_channel: str = "modularflow:gateway"
+    # 上一条广播编码后超过该字节数时，下一条在专用线程中编码；0 表示始终在事件循环内编码
+    broadcast_offload_bytes: int = 256 * 1024
+    # 广播合并窗口（毫秒），>0 时窗口内的多次广播合并为一个 JSON 数组帧；0 表示逐条发送
+    broadcast_window_ms: float = 0
     
     # 静态文件配置
     static_files_enabled: bool = False
@@ -111,11 +437,17 @@ class GatewayConfig:
             host=server_config.get("host", "0.0.0.0"),
             port=server_config.get("port", 8050),
             debug=server_config.get("debug", True),
+            workers=server_config.get("workers", 1),
+            tcp_nodelay=server_config.get("tcp_nodelay", True),
+            max_fds=server_config.get("max_fds", 65536),
+            socket_buffer_size=server_config.get("socket_buffer_size", 0),
+            gzip_minimum_size=server_config.get("gzip_minimum_size", 1024),
             cors_origins=server_config.get("cors_origins", ["*"]),
             
             # API配置
             api_prefix=api_config.get("prefix", "/api"),
             auto_discovery=api_config.get("auto_discovery", True),
+            max_body_size=api_config.get("max_body_size", 16 * 1024 * 1024),
             
             # 文档配置
             docs_enabled=docs_config.get("enabled", True),
@@ -124,6 +456,19 @@ class GatewayConfig:
             # WebSocket配置
             websocket_enabled=websocket_config.get("enabled", True),
             websocket_path=websocket_config.get("path", "/ws"),
+            websocket_weak_tracking=websocket_config.get("weak_tracking", False),
+            websocket_send_queue_size=websocket_config.get("send_queue_size", 256),
+            websocket_coalesce_ms=websocket_config.get("coalesce_ms", 0),
+            websocket_send_timeout=websocket_config.get("send_timeout", 5.0),
+            websocket_max_connections=websocket_config.get("max_connections", 1000),
+            websocket_msgpack=websocket_config.get("msgpack", True),
+            ws_impl=websocket_config.get("implementation", "websockets-sansio"),
+            ws_per_message_deflate=websocket_config.get("per_message_deflate", True),
+            ws_max_size=websocket_config.get("max_size", 16 * 1024 * 1024),
+            broadcast_url=websocket_config.get("broadcast_url", ""),
+            broadcast_channel=websocket_config.get("broadcast_channel", "modularflow:gateway"),
+            broadcast_offload_bytes=websocket_config.get("broadcast_offload_bytes", 256 * 1024),
+            broadcast_window_ms=websocket_config.get("broadcast_window_ms", 0),
             
             # 静态文件配置
             static_files_enabled=static_config.get("enabled", False),
@@ -141,19 +486,33 @@ class APIRouter:
     """API路由器 - 管理API端点注册和路由"""
     
     def __init__(self):
-        self.endpoints: List[APIEndpoint] = []
+        # 以 (method, path) 为键：重复注册时覆盖而非追加
+        self.endpoints: Dict[Tuple[str, str], APIEndpoint] = {}
+        # 按 HTTP 方法计数的端点数量（"GET,POST" 计为 2 个）
+        self._method_count = 0
         self.middlewares: List[MiddlewareConfig] = []
+        # 与 middlewares 平行的 -priority 升序列表，用于二分插入
+        self._priority_keys: List[int] = []
+        # 只读快照，在变更时重建，避免每次查询都过滤/复制列表
+        self._endpoints_cache: Optional[Tuple[APIEndpoint, ...]] = None
+        self._enabled_cache: Tuple[MiddlewareConfig, ...] = ()
         
     def add_endpoint(self, path: str, method: str, handler: Callable, **kwargs):
-        """添加API端点"""
+        """添加API端点（method 可为逗号分隔的多个方法，如 "GET,POST"）"""
         endpoint = APIEndpoint(
             path=path,
-            method=method.upper(),
+            method=method.upper().replace(" ", ""),
             handler=handler,
             **kwargs
         )
-        self.endpoints.append(endpoint)
-        logger.info(f"✓ 注册API端点: {method.upper()} {path}")
+        key = (endpoint.method, path)
+        if key in self.endpoints:
+            logger.debug(f"覆盖已注册的API端点: {endpoint.method} {path}")
+        else:
+            self._method_count += endpoint.method.count(",") + 1
+        self.endpoints[key] = endpoint
+        self._endpoints_cache = None
+        logger.info(f"✓ 注册API端点: {endpoint.method} {path}")
         
     def add_middleware(self, name: str, handler: Callable, priority: int = 0):
         """添加中间件"""
@@ -162,92 +521,169 @@ class APIRouter:
             handler=handler,
             priority=priority
         )
-        self.middlewares.append(middleware)
-        # 按优先级排序
-        self.middlewares.sort(key=lambda m: m.priority, reverse=True)
+        # 按优先级二分插入（同优先级保持注册顺序），无需每次整体重排
+        index = bisect.bisect_right(self._priority_keys, -priority)
+        self._priority_keys.insert(index, -priority)
+        self.middlewares.insert(index, middleware)
+        self._refresh_middleware_cache()
         logger.info(f"✓ 注册中间件: {name} (优先级: {priority})")
+
+    def _refresh_middleware_cache(self):
+        """重建已启用中间件快照（已按优先级排序）"""
+        self._enabled_cache = tuple(m for m in self.middlewares if m.enabled)
         
-    def get_endpoints(self) -> List[APIEndpoint]:
+    def get_endpoints(self) -> Tuple[APIEndpoint, ...]:
         """获取所有端点"""
-        return self.endpoints
+        if self._endpoints_cache is None:
+            self._endpoints_cache = tuple(self.endpoints.values())
+        return self._endpoints_cache
         
-    def get_middlewares(self) -> List[MiddlewareConfig]:
+    def endpoint_count(self) -> int:
+        """端点数量（按 HTTP 方法计数，与逐方法注册时一致）"""
+        return self._method_count
+
+    def get_middlewares(self) -> Tuple[MiddlewareConfig, ...]:
         """获取所有中间件"""
-        return [m for m in self.middlewares if m.enabled]
+        return self._enabled_cache
 
 
 class Middleware:
-    """中间件基类和预定义中间件"""
-    
-    @staticmethod
-    async def cors_middleware(request: Request, call_next):
-        """CORS中间件"""
-        response = await call_next(request)
-        response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-        return response
-    
-    @staticmethod
-    async def logging_middleware(request: Request, call_next):
-        """日志中间件"""
-        start_time = datetime.now()
-        logger.info(f"📨 {request.method} {request.url}")
-        
-        response = await call_next(request)
-        
-        process_time = (datetime.now() - start_time).total_seconds()
-        logger.info(f"📤 {response.status_code} - {process_time:.4f}s")
-        
-        return response
-    
-    @staticmethod
-    async def error_handling_middleware(request: Request, call_next):
-        """错误处理中间件"""
-        try:
-            response = await call_next(request)
-            return response
-        except Exception as e:
-            logger.error(f"❌ API错误: {str(e)}")
-            return JSONResponse(
-                status_code=500,
-                content={"error_code": "INTERNAL_ERROR", "message": "Internal Server Error", "detail": str(e)}
-            )
+    """
+    中间件基类和预定义中间件
 
+    CORS 统一由应用级 CORSMiddleware（见 GatewayConfig.cors_origins）处理，
+    不提供逐请求设置 Access-Control-* 头的 Python 中间件。
+    """
+    
     @staticmethod
     async def auth_middleware(request: Request, call_next):
         """基础鉴权中间件（示例：要求 Authorization 头）"""
-        path = str(request.url.path)
+        # 直接读取 scope，避免构造 URL 对象
+        path = request.scope.get("path", "")
         # 放行基础系统端点
         if path.endswith("/health") or path.endswith("/info"):
             return await call_next(request)
         auth = request.headers.get("Authorization")
         if not auth:
-            return JSONResponse(status_code=401, content={"error_code": "UNAUTHORIZED", "message": "缺少Authorization头"})
+            return DefaultJSONResponse(status_code=401, content={"error_code": "UNAUTHORIZED", "message": "缺少Authorization头"})
         return await call_next(request)
 
-    # 简易限流存储（内存）
-    _rate_store: Dict[str, Dict[str, Any]] = {}
+    # 简易限流存储（内存）：每个IP一个固定长度的滑动桶环 [最后写入的桶序号, 计数数组]
+    # 按IP哈希分片，每个分片独立加锁，多线程（含 free-threading 构建）下互不争用
+    _RATE_BUCKETS = 6
+    _RATE_BUCKET_SECONDS = 60 // _RATE_BUCKETS
+    _RATE_EVICT_INTERVAL = 60
+    _RATE_SHARDS = 16  # 必须为2的幂
+    _rate_shards: List[Dict[str, List[Any]]] = [{} for _ in range(_RATE_SHARDS)]
+    _rate_locks: List[threading.Lock] = [threading.Lock() for _ in range(_RATE_SHARDS)]
+
+    @staticmethod
+    def _rate_hit(client_ip: str) -> int:
+        """在滑动窗口内记录一次请求，返回窗口内的请求总数"""
+        n = Middleware._RATE_BUCKETS
+        cur = int(time.monotonic() // Middleware._RATE_BUCKET_SECONDS)
+        idx = hash(client_ip) & (Middleware._RATE_SHARDS - 1)
+        store = Middleware._rate_shards[idx]
+        with Middleware._rate_locks[idx]:
+            entry = store.get(client_ip)
+            if entry is None:
+                entry = [cur, array('I', [0] * n)]
+                store[client_ip] = entry
+            else:
+                last, buckets = entry
+                if cur - last >= n:
+                    # 整个窗口已过期，直接清零
+                    for i in range(n):
+                        buckets[i] = 0
+                else:
+                    # 清空自上次写入以来经过的桶
+                    for slot in range(last + 1, cur + 1):
+                        buckets[slot % n] = 0
+                entry[0] = cur
+            buckets = entry[1]
+            buckets[cur % n] += 1
+            return sum(buckets)
+
+    @staticmethod
+    def _evict_idle_rate_entries():
+        """移除窗口内已无请求的IP，避免限流存储无限增长"""
+        cur = int(time.monotonic() // Middleware._RATE_BUCKET_SECONDS)
+        n = Middleware._RATE_BUCKETS
+        for store, lock in zip(Middleware._rate_shards, Middleware._rate_locks):
+            with lock:
+                idle = [ip for ip, (last, buckets) in store.items()
+                        if cur - last >= n or not sum(buckets)]
+                for ip in idle:
+                    del store[ip]
+
+    @staticmethod
+    async def _rate_evict_loop():
+        """周期性清理限流存储（由网关在应用生命周期内启停）"""
+        while True:
+            await asyncio.sleep(Middleware._RATE_EVICT_INTERVAL)
+            Middleware._evict_idle_rate_entries()
 
     @staticmethod
     async def rate_limit_middleware(request: Request, call_next):
-        """基础限流中间件（每IP每分钟限次）"""
+        """基础限流中间件（每IP每分钟限次，滑动窗口）"""
         try:
             client_ip = request.client.host if request.client else "unknown"
-            now_minute = datetime.now().strftime("%Y%m%d%H%M")
-            key = f"{client_ip}:{now_minute}"
-            record = Middleware._rate_store.get(key, {"count": 0})
-            record["count"] += 1
-            Middleware._rate_store[key] = record
             # 默认限流阈值（如需读取配置，可在此扩展）
             limit = 120
-            if record["count"] > limit:
-                return JSONResponse(status_code=429, content={"error_code": "RATE_LIMITED", "message": "请求过于频繁"})
+            if Middleware._rate_hit(client_ip) > limit:
+                return DefaultJSONResponse(status_code=429, content={"error_code": "RATE_LIMITED", "message": "请求过于频繁"})
         except Exception as e:
             logger.warning(f"限流中间件异常: {e}")
         return await call_next(request)
 
 
+class CoreMiddleware:
+    """
+    核心ASGI中间件：合并请求日志与错误处理
+
+    以纯ASGI形式实现，避免每个 app.middleware("http") 额外包裹一层
+    BaseHTTPMiddleware（每请求一个任务与内存流）。skip_paths 中的路径
+    （健康检查、文档等高频探测端点）直接透传，不记录日志。
+    """
+
+    def __init__(self, app, skip_paths: frozenset = frozenset()):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter_ns()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("📨 %s %s", scope.get("method", ""), scope.get("path", ""))
+
+        status = [500]
+        started = [False]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                started[0] = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            logger.error(f"❌ API错误: {str(e)}")
+            if started[0]:
+                # 响应已开始发送，无法再改写为错误响应
+                raise
+            response = DefaultJSONResponse(
+                status_code=500,
+                content={"error_code": "INTERNAL_ERROR", "message": "Internal Server Error", "detail": str(e)}
+            )
+            await response(scope, receive, send_wrapper)
+        finally:
+            elapsed_ms = (time.perf_counter_ns() - start) / 1_000_000
+            logger.info("📤 %d - %.3fms", status[0], elapsed_ms)
+
+
 class APIGateway:
     """
     API网关主类
@@ -272,12 +708,59 @@ class APIGateway:
         self.app = None
         self.router = APIRouter()
         self.config = None
-        self.websocket_connections = []
+        self.websocket_connections: Set[WebSocketClient] = set()
+        # 已占用的连接名额（在检查上限时同步占位，握手期间的连接也计入）
+        self._websocket_slots = 0
         self._server_thread = None
         self._server = None
+        self._server_loop: Optional[asyncio.AbstractEventLoop] = None
+        # 大体积广播的编码线程（按需创建）
+        self._encode_executor: Optional[ThreadPoolExecutor] = None
+        self._last_broadcast_size = 0
+        # 广播合并窗口内待发送的消息及其刷新任务
+        self._pending_broadcast: List[Dict[str, Any]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        # Redis 广播通道（仅在配置 broadcast_url 时启用）
+        self._backplane = None
+        self._backplane_task: Optional[asyncio.Task] = None
+        self._backplane_enabled = False
+        # 限流存储清理任务（注册了限流中间件时随应用生命周期启停）
+        self._rate_evict_task: Optional[asyncio.Task] = None
+        # 是否已挂载 CoreMiddleware（计入信息端点的中间件数量）
+        self._core_middleware_mounted = False
+        # 已挂载（或已按 CORS 规则忽略）的路由器中间件 id，避免重复挂载
+        self._mounted_middlewares: Set[int] = set()
+        # 已挂载到FastAPI的端点 (method, path)，避免重复注册路由
+        self._mounted_endpoints: Dict[Tuple[str, str], Callable] = {}
+        # 配置快照缓存：(配置对象, 字典副本)
+        self._config_snapshot: Optional[Tuple[GatewayConfig, Dict[str, Any]]] = None
+        # 健康检查响应缓存（按秒刷新）
+        self._health_second = -1
+        self._health_body = b""
+        # API信息响应缓存：计数变化或超过 5 秒时重建
+        self._info_key: Optional[Tuple[int, int, int]] = None
+        self._info_time = 0.0
+        self._info_body = b""
+        # api_gateway.info 结果缓存：(计数键, 配置对象, 计数字典)
+        self._info_snapshot: Optional[Tuple[Tuple[int, int, int], Optional[GatewayConfig], Dict[str, Any]]] = None
+        # 序列化后的 OpenAPI 文档缓存
+        self._openapi_bytes: Optional[bytes] = None
+        # WebSocket function_call 的函数查找缓存：名称 -> (函数, 是否协程)，自动发现时失效
+        self._api_cache: Dict[str, Tuple[Callable, bool]] = {}
+        # WebSocket 消息类型 -> 处理方法
+        self._ws_handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "ping": self._ws_ping,
+            "function_call": self._ws_function_call,
+        }
+        # 注册表与服务管理器均为进程级单例，初始化时取一次句柄即可
+        self._registry = get_registry()
+        self._service_manager = get_service_manager()
         
         # 加载配置
         self._load_config(config, config_file, project_config)
+        if self.config and self.config.websocket_weak_tracking:
+            # 弱引用跟踪：已关闭且无其他引用的连接会被自动回收
+            self.websocket_connections = weakref.WeakSet()
         
         # 初始化FastAPI应用
         if FastAPI and self.config:
@@ -323,8 +806,7 @@ class APIGateway:
         
         if config_path and config_path.exists():
             try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config_data = json.load(f)
+                config_data = _load_json_file(config_path)
                 self.config = GatewayConfig.from_dict(config_data)
                 logger.info(f"✓ 从文件加载API配置: {config_path}")
             except Exception as e:
@@ -380,9 +862,19 @@ class APIGateway:
             title=self.config.title,
             description=self.config.description,
             version=self.config.version,
-            docs_url=self.config.docs_url if self.config.docs_enabled else None
+            docs_url=self.config.docs_url if self.config.docs_enabled else None,
+            default_response_class=DefaultJSONResponse,
+            lifespan=self._lifespan
         )
         
+        # 用预序列化的处理器替换默认的 /openapi.json 路由
+        openapi_url = self.app.openapi_url
+        if openapi_url:
+            self.app.router.routes[:] = [
+                r for r in self.app.router.routes if getattr(r, "path", None) != openapi_url
+            ]
+            self.app.add_route(openapi_url, self._openapi_json_handler, include_in_schema=False)
+        
         # 配置CORS
         self.app.add_middleware(
             CORSMiddleware,
@@ -392,17 +884,54 @@ class APIGateway:
             allow_headers=["*"],
         )
         
+        # 压缩较大的响应（JSON 通常可压缩一半以上）
+        if self.config.gzip_minimum_size > 0:
+            self.app.add_middleware(GZipMiddleware, minimum_size=self.config.gzip_minimum_size)
+        
         logger.info("✓ FastAPI应用初始化完成")
     
     def _setup_default_middlewares(self):
         """设置默认中间件"""
-        # 基础中间件
-        self.router.add_middleware("logging", Middleware.logging_middleware, priority=100)
-        self.router.add_middleware("error_handling", Middleware.error_handling_middleware, priority=90)
-        # 注册到 FastAPI 应用
+        # 日志与错误处理由 CoreMiddleware 统一在最外层完成，自定义中间件挂载在其内层
         if self.app:
-            for m in self.router.get_middlewares():
-                self.app.middleware("http")(m.handler)
+            self.app.add_middleware(CoreMiddleware, skip_paths=self._quiet_paths())
+            self._core_middleware_mounted = True
+            self._mount_router_middlewares()
+
+    def _mount_router_middlewares(self):
+        """将路由器中尚未挂载的中间件挂载到 CoreMiddleware 内层（应用开始处理请求后无法再挂载）"""
+        if not self.app:
+            return
+        pending = [m for m in self.router.get_middlewares() if id(m) not in self._mounted_middlewares]
+        if not pending:
+            return
+        if self.app.middleware_stack is not None:
+            logger.warning(f"⚠️ 应用已启动，忽略 {len(pending)} 个新注册的中间件")
+            return
+        core_index = next(
+            (i for i, m in enumerate(self.app.user_middleware) if m.cls is CoreMiddleware), -1
+        )
+        for m in pending:
+            self._mounted_middlewares.add(id(m))
+            if m.name.lower() == "cors":
+                # CORS 已由 CORSMiddleware 处理，避免重复设置响应头
+                logger.warning(f"⚠️ 忽略中间件 {m.name}: CORS 由 CORSMiddleware 统一处理")
+                continue
+            # 与 app.middleware("http") 相同，后挂载的位于外层
+            self.app.user_middleware.insert(core_index + 1, ASGIMiddleware(BaseHTTPMiddleware, dispatch=m.handler))
+
+    def _middleware_count(self) -> int:
+        """已生效的中间件数量：自定义中间件加上 CoreMiddleware（合并了日志与错误处理）"""
+        return len(self.router.get_middlewares()) + self._core_middleware_mounted
+    
+    def _quiet_paths(self) -> frozenset:
+        """不经过日志中间件的高频端点：健康检查与文档"""
+        paths = {f"{self.config.api_prefix}/health"}
+        if self.app.docs_url:
+            paths.add(self.app.docs_url)
+        if self.app.openapi_url:
+            paths.add(self.app.openapi_url)
+        return frozenset(paths)
     
     def _setup_default_routes(self):
         """设置默认路由"""
@@ -429,22 +958,30 @@ class APIGateway:
             self._register_endpoints_to_fastapi()
     
     async def _health_check_handler(self):
-        """健康检查处理器"""
-        return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+        """健康检查处理器（响应体每秒最多序列化一次）"""
+        second = int(time.monotonic())
+        if second != self._health_second:
+            self._health_second = second
+            self._health_body = _dumps_bytes({"status": "healthy", "timestamp": datetime.now().isoformat()})
+        return Response(self._health_body, media_type="application/json")
     
     async def _api_info_handler(self):
-        """API信息处理器"""
-        service_manager = get_service_manager()
-        services = service_manager.list_services()
-        
-        return {
-            "title": self.config.title if self.config else "ModularFlow API Gateway",
-            "version": self.config.version if self.config else "1.0.0", 
-            "endpoints": len(self.router.get_endpoints()),
-            "middlewares": len(self.router.get_middlewares()),
-            "services": {k: len(v) for k, v in services.items()},
-            "websocket_connections": len(self.websocket_connections)
-        }
+        """API信息处理器（计数不变时 5 秒内复用已序列化的响应体）"""
+        now = time.monotonic()
+        key = (self.router.endpoint_count(), self._middleware_count(), len(self.websocket_connections))
+        if key != self._info_key or now - self._info_time > 5:
+            services = self._service_manager.list_services()
+            self._info_body = _dumps_bytes({
+                "title": self.config.title if self.config else "ModularFlow API Gateway",
+                "version": self.config.version if self.config else "1.0.0", 
+                "endpoints": key[0],
+                "middlewares": key[1],
+                "services": {k: len(v) for k, v in services.items()},
+                "websocket_connections": key[2]
+            })
+            self._info_key = key
+            self._info_time = now
+        return Response(self._info_body, media_type="application/json")
     
     def _register_endpoints_to_fastapi(self):
         """将路由器中的端点注册到FastAPI应用"""
@@ -452,82 +989,309 @@ class APIGateway:
             return
             
         for endpoint in self.router.get_endpoints():
+            key = (endpoint.method, endpoint.path)
+            previous = self._mounted_endpoints.get(key)
+            if previous is endpoint.handler:
+                continue
+            self._mounted_endpoints[key] = endpoint.handler
             full_path = f"{self.config.api_prefix}{endpoint.path}"
             
-            if endpoint.method == "GET":
-                self.app.get(full_path, tags=endpoint.tags, summary=endpoint.summary)(endpoint.handler)
-            elif endpoint.method == "POST":
-                self.app.post(full_path, tags=endpoint.tags, summary=endpoint.summary)(endpoint.handler)
-            elif endpoint.method == "PUT":
-                self.app.put(full_path, tags=endpoint.tags, summary=endpoint.summary)(endpoint.handler)
-            elif endpoint.method == "DELETE":
-                self.app.delete(full_path, tags=endpoint.tags, summary=endpoint.summary)(endpoint.handler)
-
-        # 基于注册表构建简化版 OpenAPI（仅用于外部文档展示）
-        try:
-            registry = get_registry()
-            specs = [registry.get_spec(n) for n in registry.list_functions()]
-            paths = {}
-            for spec in specs:
-                if not spec:
-                    continue
-                # 根据函数来源模块，为 OpenAPI 路径添加 /modules 或 /workflow 前缀；仅包含 api/* 层的能力
-                fn = None
-                try:
-                    fn = get_registered_api(spec.name)
-                except Exception:
-                    fn = None
-                origin_mod = getattr(fn, "__module__", "") if fn else ""
-                if origin_mod.startswith("api.modules"):
-                    prefix_seg = "/modules"
-                elif origin_mod.startswith("api.workflow"):
-                    prefix_seg = "/workflow"
-                else:
-                    # 跳过实现层注册项
-                    continue
-                path = f"{self.config.api_prefix}{prefix_seg}/{spec.name.replace('.', '/')}"
-                # GET
-                paths.setdefault(path, {})
-                paths[path]["get"] = {
-                    "summary": f"调用: {spec.name}",
-                    "responses": {"200": {"description": "OK"}}
-                }
-                # POST
-                # 构建简单的请求体 schema
+            # 一个端点可声明多个方法（逗号分隔），只生成一条路由
+            methods = endpoint.method.split(",")
+            if previous is not None:
+                # 处理器已更换：移除旧路由，否则先注册的旧路由会继续匹配请求
+                wanted = set(methods)
+                self.app.router.routes[:] = [
+                    r for r in self.app.router.routes
+                    if not (getattr(r, "path", None) == full_path and wanted <= (getattr(r, "methods", None) or set()))
+                ]
+            if endpoint.raw:
+                self.app.router.routes.append(Route(full_path, endpoint.handler, methods=methods))
+            else:
+                self.app.add_api_route(
+                    full_path,
+                    endpoint.handler,
+                    methods=methods,
+                    tags=endpoint.tags,
+                    summary=endpoint.summary,
+                    response_class=DefaultJSONResponse
+                )
+
+        # OpenAPI 改为按需构建：端点变化后仅使缓存失效
+        self.app.openapi_schema = None
+        self._openapi_bytes = None
+        self.app.openapi = self._get_openapi_schema
+
+    def _build_openapi_schema(self) -> Dict[str, Any]:
+        """基于注册表构建简化版 OpenAPI（仅用于外部文档展示）"""
+        registry = self._registry
+        paths = {}
+        # 入参形态相同的函数共享同一个请求体 schema 对象
+        schema_cache: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        for spec in registry.specs.values():
+            if not spec:
+                continue
+            # 根据函数来源模块，为 OpenAPI 路径添加 /modules 或 /workflow 前缀；仅包含 api/* 层的能力
+            fn = registry.functions.get(spec.name)
+            origin_mod = getattr(fn, "__module__", "") if fn else ""
+            if origin_mod.startswith("api.modules"):
+                prefix_seg = "/modules"
+            elif origin_mod.startswith("api.workflow"):
+                prefix_seg = "/workflow"
+            else:
+                # 跳过实现层注册项
+                continue
+            path = f"{self.config.api_prefix}{prefix_seg}/{spec.name.replace('.', '/')}"
+            # 构建简单的请求体 schema
+            key = tuple(spec.inputs or ())
+            req_schema = schema_cache.get(key)
+            if req_schema is None:
                 req_schema = {
                     "type": "object",
-                    "properties": {inp: {"type": "string"} for inp in (spec.inputs or [])},
-                    "required": spec.inputs or []
+                    "properties": {inp: {"type": "string"} for inp in key},
+                    "required": list(key)
                 }
-                paths[path]["post"] = {
-                    "summary": f"调用: {spec.name}",
+                schema_cache[key] = req_schema
+            # 同一路径的 GET 与 POST 合并为一个条目
+            summary = f"调用: {spec.name}"
+            paths[path] = {
+                "get": {
+                    "summary": summary,
+                    "responses": {"200": {"description": "OK"}}
+                },
+                "post": {
+                    "summary": summary,
                     "requestBody": {
                         "required": bool(spec.inputs),
                         "content": {"application/json": {"schema": req_schema}}
                     },
                     "responses": {"200": {"description": "OK"}}
                 }
-            self.app.openapi_schema = {
-                "openapi": "3.0.0",
-                "info": {"title": self.config.title, "version": self.config.version},
-                "paths": paths
             }
-            self.app.openapi = lambda: self.app.openapi_schema
-        except Exception as e:
-            logger.warning(f"⚠️ 构建OpenAPI失败: {e}")
+        return {
+            "openapi": "3.0.0",
+            "info": {"title": self.config.title, "version": self.config.version},
+            "paths": paths
+        }
+
+    def _get_openapi_schema(self) -> Dict[str, Any]:
+        """获取（并缓存）OpenAPI 文档"""
+        if self.app.openapi_schema is None:
+            try:
+                self.app.openapi_schema = self._build_openapi_schema()
+            except Exception as e:
+                logger.warning(f"⚠️ 构建OpenAPI失败: {e}")
+                return {
+                    "openapi": "3.0.0",
+                    "info": {"title": self.config.title, "version": self.config.version},
+                    "paths": {}
+                }
+        return self.app.openapi_schema
+
+    async def _openapi_json_handler(self, request: Request):
+        """返回预序列化的 OpenAPI JSON，避免每次请求重新编码"""
+        if self._openapi_bytes is None:
+            self._openapi_bytes = _dumps_bytes(self._get_openapi_schema())
+        return Response(content=self._openapi_bytes, media_type="application/json")
     
+    def _create_function_handler(self, fn: Callable, name: str) -> Callable:
+        """
+        为注册函数生成专用的请求处理器
+
+        函数签名、类型注解、必填参数与协程判断均在注册时一次性完成，
+        并按入参个数选择对应的处理器，请求路径上只执行必要的解析逻辑。
+        """
+        spec = self._registry.get_spec(name)
+        expected_inputs = tuple(spec.inputs) if spec and spec.inputs else ()
+        expected_set = frozenset(expected_inputs)
+        is_coro = _is_coroutine_callable(fn)
+
+        try:
+            sig = inspect.signature(fn)
+        except (TypeError, ValueError):
+            sig = None
+        try:
+            hints = typing.get_type_hints(fn)
+        except Exception:
+            hints = {}
+
+        # 输入必填判断（基于注册表 + 函数签名判断可选/默认）
+        if sig is not None:
+            required_inputs = tuple(
+                p.name for p in sig.parameters.values()
+                if p.name in expected_set
+                and p.default is inspect.Parameter.empty
+                and not _is_optional(hints.get(p.name, p.annotation))
+            )
+        else:
+            # 退化到全部期望输入为必填
+            required_inputs = expected_inputs
+        required_set = frozenset(required_inputs)
+        type_validators = {}
+        for k in expected_inputs:
+            if k in hints:
+                is_valid = _make_type_validator(hints[k])
+                if is_valid is not None:
+                    type_validators[k] = (is_valid, str(hints[k]))
+
+        # 预热键名转换缓存，请求时的 camelCase 键名直接命中
+        for k in expected_inputs:
+            _to_snake(k)
+            _to_snake(_to_camel(k))
+
+        def map_keys(items) -> Dict[str, Any]:
+            # 键名映射（camelCase -> snake_case），仅保留函数所需入参
+            mapped = {}
+            for k, v in items:
+                k2 = _to_snake(k)
+                if not expected_set or k2 in expected_set:
+                    mapped[k2] = v
+            return mapped
+
+        async def invoke(data: Dict[str, Any], is_json: bool):
+            if required_set:
+                missing = required_set.difference(data) if isinstance(data, dict) else required_set
+                if missing:
+                    return DefaultJSONResponse(status_code=400, content={
+                        "error_code": "MISSING_REQUIRED",
+                        "message": "缺少必填字段",
+                        "missing": [k for k in required_inputs if k in missing]
+                    })
+
+            # 基于函数签名的简单类型校验（仅对 application/json 生效）
+            if is_json and type_validators and isinstance(data, dict):
+                type_errors = _check_input_types(data, type_validators)
+                if type_errors:
+                    return DefaultJSONResponse(status_code=422, content={
+                        "error_code": "INVALID_TYPE",
+                        "message": "参数类型不匹配",
+                        "details": type_errors
+                    })
+
+            # 协程直接等待；同步函数放入线程池执行，避免阻塞事件循环上的其他请求与连接
+            if is_coro:
+                result = await fn(**(data or {}))
+            else:
+                _IN_GATEWAY_CALL.set(True)
+                result = await run_in_threadpool(fn, **(data or {}))
+            # 直接返回响应对象，跳过 FastAPI 的 jsonable_encoder
+            return result if isinstance(result, Response) else DefaultJSONResponse(result)
+
+        body_limit = self.config.max_body_size
+
+        def too_large():
+            return DefaultJSONResponse(status_code=413, content={
+                "error_code": "PAYLOAD_TOO_LARGE",
+                "message": "请求体过大",
+                "limit": body_limit
+            })
+
+        def invalid_json(e: _InvalidJSON):
+            return DefaultJSONResponse(status_code=400, content={
+                "error_code": "INVALID_JSON",
+                "message": "请求体不是合法的JSON",
+                "detail": str(e)
+            })
+
+        async def _handle_noargs(request: Request = None):
+            try:
+                return await invoke({}, False)
+            except Exception as e:
+                return DefaultJSONResponse({"error": str(e)})
+
+        # 单参数函数的键名（含 camelCase 形式），供查询参数直接命中
+        key = expected_inputs[0] if len(expected_inputs) == 1 else None
+        camel_key = _to_camel(key) if key else None
+
+        # 注意：处理器签名只能包含 request，否则会被 FastAPI 识别为查询参数
+        async def _handle_single(request: Request = None):
+            try:
+                data = {}
+                content_type = ""
+                if request:
+                    content_type = (request.headers.get("content-type", "") or "").lower()
+                    if request.method.upper() == "POST":
+                        if "multipart/form-data" in content_type:
+                            # 解析表单与文件，避免将二进制当作UTF-8解码
+                            form = await _read_form(request, body_limit)
+                            # 优先尝试按预期键名获取
+                            val = form.get(key)
+                            if val is None:
+                                # 尝试获取任意文件字段
+                                for v in form.values():
+                                    if isinstance(v, UploadFile):
+                                        val = v
+                                        break
+                                # 仍未获取到文件则退回第一个值
+                                if val is None and form:
+                                    val = next(iter(form.values()), None)
+                            data = {key: val} if val is not None else {}
+                        elif "application/json" in content_type:
+                            # 仅在明确为JSON时解析（空请求体视为无参数）
+                            data = await _read_json(request, body_limit)
+                        else:
+                            # 原始二进制或其他类型：仅此分支需要完整读取请求体
+                            body_bytes = await _read_body(request, body_limit)
+                            if body_bytes:
+                                data = {key: body_bytes}
+                    else:
+                        # GET 等其他方法：从查询参数获取，优先按键名直接命中
+                        qp = request.query_params
+                        val = qp.get(key)
+                        if val is None:
+                            val = qp.get(camel_key)
+                        if val is not None:
+                            data = {key: val}
+                        elif qp:
+                            data = map_keys(qp.multi_items())
+                return await invoke(data, "application/json" in content_type)
+            except _BodyTooLarge:
+                return too_large()
+            except _InvalidJSON as e:
+                return invalid_json(e)
+            except Exception as e:
+                return DefaultJSONResponse({"error": str(e)})
+
+        async def _handle_multi(request: Request = None):
+            try:
+                data = {}
+                content_type = ""
+                if request:
+                    content_type = (request.headers.get("content-type", "") or "").lower()
+                    if request.method.upper() == "POST":
+                        if "multipart/form-data" in content_type:
+                            # 多参数场景：按规范匹配（支持 camelCase -> snake_case）
+                            form = await _read_form(request, body_limit)
+                            data = map_keys(form.items())
+                        elif "application/json" in content_type:
+                            data = await _read_json(request, body_limit)
+                    else:
+                        qp = request.query_params
+                        if qp:
+                            data = map_keys(qp.multi_items())
+                return await invoke(data, "application/json" in content_type)
+            except _BodyTooLarge:
+                return too_large()
+            except _InvalidJSON as e:
+                return invalid_json(e)
+            except Exception as e:
+                return DefaultJSONResponse({"error": str(e)})
+
+        if not expected_inputs:
+            return _handle_noargs
+        if len(expected_inputs) == 1:
+            return _handle_single
+        return _handle_multi
+
     def discover_and_register_functions(self):
         """自动发现并注册函数作为API端点"""
         if not self.config or not self.config.auto_discovery:
             return
             
+        self._api_cache.clear()
         # 直接从函数注册表获取函数列表
-        registry = get_registry()
-        function_names = registry.list_functions()
-        
-        for func_name in function_names:
+        for func_name, func in list(self._registry.functions.items()):
             try:
-                func = get_registered_api(func_name)
                 if func:
                     # 仅暴露 api/* 层注册的能力，并基于来源目录自动添加前缀 /modules 或 /workflow
                     origin_mod = getattr(func, "__module__", "") or ""
@@ -540,193 +1304,17 @@ class APIGateway:
                         continue
                     api_path = f"{prefix_seg}/{func_name.replace('.', '/')}"
                     
-                    # 创建API处理器
-                    def create_handler(fn=func, name=func_name):
-                        async def handler(request: Request = None):
-                            try:
-                                data = {}
-                                # 统一将请求数据映射为函数所需的入参，避免错误解析二进制内容为JSON
-                                if request:
-                                    method = request.method.upper()
-                                    content_type = (request.headers.get("content-type", "") or "").lower()
-                                    body_bytes = await request.body()
-                                    
-                                    # 获取函数输入规范，以便做键名映射（如 camelCase -> snake_case）
-                                    registry = get_registry()
-                                    spec = registry.get_spec(name) if registry else None
-                                    expected_inputs = spec.inputs if spec else []
-                                    
-                                    def to_snake(s: str) -> str:
-                                        out = []
-                                        for ch in s:
-                                            if ch.isupper():
-                                                out.append('_')
-                                                out.append(ch.lower())
-                                            else:
-                                                out.append(ch)
-                                        return ''.join(out).lstrip('_')
-                                    
-                                    if method == "POST":
-                                        if "multipart/form-data" in content_type:
-                                            # 解析表单与文件，避免将二进制当作UTF-8解码
-                                            form = await request.form()
-                                            
-                                            if len(expected_inputs) == 1:
-                                                key = expected_inputs[0]
-                                                # 优先尝试按预期键名获取
-                                                val = form.get(key)
-                                                if val is None:
-                                                    # 尝试获取任意文件字段
-                                                    for k, v in form.items():
-                                                        if hasattr(v, "file"):  # UploadFile 或类似对象
-                                                            val = v
-                                                            break
-                                                    # 仍未获取到文件则退回第一个值
-                                                    if val is None and form:
-                                                        try:
-                                                            val = list(form.values())[0]
-                                                        except Exception:
-                                                            val = None
-                                                data = {key: val} if val is not None else {}
-                                            else:
-                                                # 多参数场景：按规范匹配（支持 camelCase -> snake_case）
-                                                mapped = {}
-                                                for k, v in form.items():
-                                                    k2 = to_snake(k)
-                                                    if not expected_inputs or k2 in expected_inputs:
-                                                        mapped[k2] = v
-                                                data = mapped
-                                        
-                                        elif "application/json" in content_type:
-                                            # 仅在明确为JSON时解析
-                                            data = await request.json() if body_bytes else {}
-                                        
-                                        else:
-                                            # 原始二进制或其他类型
-                                            if body_bytes:
-                                                if len(expected_inputs) == 1:
-                                                    data = {expected_inputs[0]: body_bytes}
-                                                else:
-                                                    data = {}
-                                            else:
-                                                data = {}
-                                    else:
-                                        # GET 等其他方法：从查询参数获取，并做键名转换
-                                        q = dict(request.query_params) if request else {}
-                                        if q:
-                                            mapped = {}
-                                            for k, v in q.items():
-                                                k2 = to_snake(k)
-                                                if not expected_inputs or k2 in expected_inputs:
-                                                    mapped[k2] = v
-                                            data = mapped
-                                
-                                # 输入必填校验（基于注册表 + 函数签名判断可选/默认）
-                                spec = get_registry().get_spec(name)
-                                expected_inputs = spec.inputs if spec else []
-                                if expected_inputs:
-                                    import inspect as _ins
-                                    from typing import get_origin as _get_origin, get_args as _get_args, Union as _Union
-                                    required_inputs = []
-                                    try:
-                                        sig = _ins.signature(fn)
-                                        for param in sig.parameters.values():
-                                            pname = param.name
-                                            if pname not in expected_inputs:
-                                                continue
-                                            ann = param.annotation
-                                            has_default = param.default is not _ins._empty
-                                            is_optional = False
-                                            try:
-                                                origin = _get_origin(ann)
-                                                args = _get_args(ann)
-                                                is_optional = (origin is _Union) and (type(None) in args)
-                                            except Exception:
-                                                is_optional = False
-                                            if not has_default and not is_optional:
-                                                required_inputs.append(pname)
-                                    except Exception:
-                                        # 退化到全部期望输入为必填
-                                        required_inputs = list(expected_inputs)
-                                    missing = [k for k in required_inputs if k not in (data or {})]
-                                    if missing:
-                                        return JSONResponse(status_code=400, content={
-                                            "error_code": "MISSING_REQUIRED",
-                                            "message": "缺少必填字段",
-                                            "missing": missing
-                                        })
-
-                                # 基于函数签名的简单类型校验（仅对 application/json 生效）
-                                try:
-                                    import typing as _t
-                                    from typing import get_origin as _get_origin, get_args as _get_args
-                                except Exception:
-                                    _t = None
-                                    _get_origin = lambda t: None
-                                    _get_args = lambda t: ()
-
-                                if _t is not None:
-                                    try:
-                                        hints = _t.get_type_hints(fn)
-                                    except Exception:
-                                        hints = {}
-                                    if hints and isinstance(data, dict) and "application/json" in (content_type or "").lower():
-                                        type_errors = []
-                                        for k in expected_inputs or []:
-                                            if k in data and k in hints:
-                                                expected = hints[k]
-                                                v = data[k]
-                                                origin = _get_origin(expected)
-                                                # 仅做基础类型与容器判断，复杂联合类型留空
-                                                ok = True
-                                                if origin is list:
-                                                    ok = isinstance(v, list)
-                                                elif origin is dict:
-                                                    ok = isinstance(v, dict)
-                                                elif expected in (str, int, float, bool, list, dict):
-                                                    ok = isinstance(v, expected)
-                                                # 其余注解（如 Optional/Union/自定义）暂不强制
-                                                if not ok:
-                                                    type_errors.append({
-                                                        "field": k,
-                                                        "expected": str(expected),
-                                                        "actual": type(v).__name__
-                                                    })
-                                        if type_errors:
-                                            return JSONResponse(status_code=422, content={
-                                                "error_code": "INVALID_TYPE",
-                                                "message": "参数类型不匹配",
-                                                "details": type_errors
-                                            })
-
-                                # 协程/同步统一调用
-                                import inspect
-                                if inspect.iscoroutinefunction(fn):
-                                    result = await fn(**(data or {}))
-                                else:
-                                    result = fn(**(data or {})) if data else fn()
-                                return result
-                            except Exception as e:
-                                return {"error": str(e)}
-                        return handler
-                    
-                    handler = create_handler()
+                    # 创建API处理器（注册时完成反射分析）
+                    handler = self._create_function_handler(func, func_name)
                     
-                    # 注册为API端点 (支持GET和POST)
+                    # 注册为API端点：GET 与 POST 共用同一条路由
                     self.router.add_endpoint(
                         api_path, 
-                        "GET", 
+                        "GET,POST", 
                         handler,
                         tags=["functions"],
-                        summary=f"调用函数: {func_name}"
-                    )
-                    
-                    self.router.add_endpoint(
-                        api_path, 
-                        "POST", 
-                        handler,
-                        tags=["functions"], 
-                        summary=f"调用函数: {func_name}"
+                        summary=f"调用函数: {func_name}",
+                        raw=True
                     )
                     
                     logger.info(f"✓ 自动注册函数API: {func_name} -> {api_path}")
@@ -735,28 +1323,62 @@ class APIGateway:
                 logger.error(f"❌ 注册函数API失败 {func_name}: {e}")
     
     def setup_websocket(self):
-        """设置WebSocket支持"""
+        """
+        设置WebSocket支持
+
+        底层协议实现由 GatewayConfig.ws_impl 选择：websockets-sansio 省去逐帧的
+        asyncio 间接调用，较旧的 uvicorn 不支持时回退到 auto。
+        per-message-deflate 可降低带宽，但会为每个连接增加压缩的CPU与内存开销，
+        大量连接且消息较小时可通过 ws_per_message_deflate 关闭。
+        """
         if not self.app or not self.config or not self.config.websocket_enabled:
             return
             
+        if self.config.broadcast_url:
+            if aioredis is None:
+                logger.warning("⚠️ 未安装 redis，跨进程广播不可用，仅广播到本进程连接")
+            else:
+                # 由应用生命周期（_lifespan）在启动时连接、关闭时断开
+                self._backplane_enabled = True
+            
         @self.app.websocket(self.config.websocket_path)
         async def websocket_endpoint(websocket: WebSocket):
-            await websocket.accept()
-            self.websocket_connections.append(websocket)
-            logger.info(f"✓ WebSocket连接建立: {len(self.websocket_connections)}个活跃连接")
+            max_connections = self.config.websocket_max_connections
+            if max_connections and self._websocket_slots >= max_connections:
+                logger.warning(f"⚠️ WebSocket连接数已达上限({max_connections})，拒绝新连接")
+                await websocket.close(code=1013)
+                return
+            # 检查与占位之间没有 await，并发握手的连接不会同时通过上限检查
+            self._websocket_slots += 1
+            client = None
             
             try:
+                use_msgpack = (
+                    self.config.websocket_msgpack and msgpack is not None
+                    and "msgpack" in websocket.scope.get("subprotocols", ())
+                )
+                await websocket.accept(subprotocol="msgpack" if use_msgpack else None)
+                client = WebSocketClient(
+                    websocket, asyncio.Queue(maxsize=self.config.websocket_send_queue_size), msgpack=use_msgpack
+                )
+                client.writer_task = asyncio.get_running_loop().create_task(self._websocket_writer(client))
+                self.websocket_connections.add(client)
+                logger.info(f"✓ WebSocket连接建立: {len(self.websocket_connections)}个活跃连接")
+                
                 while True:
                     try:
-                        # 接收消息
-                        data = await websocket.receive_text()
-                        message = json.loads(data)
+                        # 接收消息（文本帧与二进制帧均直接交给解析器）
+                        raw = await self._receive_frame(websocket)
+                        if client.msgpack and isinstance(raw, bytes):
+                            message = msgpack.unpackb(raw, raw=False)
+                        else:
+                            message = _loads(raw)
                         
                         # 处理消息
                         response = await self._handle_websocket_message(message)
                         
-                        # 发送响应
-                        await websocket.send_text(json.dumps(response))
+                        # 发送响应（经由发送队列，与广播保持顺序）
+                        self._enqueue_websocket(client, self._encode_for(client, response))
                         
                     except (WebSocketDisconnect, ConnectionResetError, ConnectionAbortedError):
                         # WebSocket连接断开或重置
@@ -767,12 +1389,9 @@ class APIGateway:
                         try:
                             # 检查WebSocket状态
                             if websocket.client_state != WebSocketState.DISCONNECTED:
-                                error_response = {
-                                    "type": "error",
-                                    "error": "消息处理失败",
-                                    "detail": str(e)
-                                }
-                                await websocket.send_text(json.dumps(error_response))
+                                self._enqueue_websocket(
+                                    client, self._encode_for(client, _WS_ERROR_PREFIX + _dumps_text(str(e)) + "}")
+                                )
                             else:
                                 break
                         except:
@@ -782,61 +1401,288 @@ class APIGateway:
             except Exception as e:
                 logger.error(f"❌ WebSocket错误: {e}")
             finally:
-                if websocket in self.websocket_connections:
-                    self.websocket_connections.remove(websocket)
-                logger.info(f"✓ WebSocket连接断开: {len(self.websocket_connections)}个活跃连接")
+                self._websocket_slots -= 1
+                if client is not None:
+                    self.websocket_connections.discard(client)
+                    client.writer_task.cancel()
+                    logger.info(f"✓ WebSocket连接断开: {len(self.websocket_connections)}个活跃连接")
     
-    async def _handle_websocket_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
-        """处理WebSocket消息"""
+    @staticmethod
+    async def _receive_frame(websocket: WebSocket) -> Union[str, bytes]:
+        """接收一帧原始数据：文本帧返回 str，二进制帧返回 bytes，不做额外的编解码"""
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        data = message.get("text")
+        return data if data is not None else message.get("bytes") or b""
+
+    async def _handle_websocket_message(self, message: Dict[str, Any]) -> Union[Dict[str, Any], str]:
+        """处理WebSocket消息，返回响应字典或已编码的JSON文本"""
         try:
             msg_type = message.get("type", "ping")
-            
-            if msg_type == "ping":
-                return {"type": "pong", "timestamp": datetime.now().isoformat()}
-            elif msg_type == "function_call":
-                # 调用注册的函数
-                func_name = message.get("function")
-                params = message.get("params", {})
-                
-                func = get_registered_api(func_name)
-                if func:
-                    result = func(**params) if params else func()
-                    return {
-                        "type": "function_result",
-                        "function": func_name,
-                        "success": True,
-                        "result": result
-                    }
-                else:
-                    return {
-                        "type": "function_result", 
-                        "function": func_name,
-                        "success": False,
-                        "error": f"函数不存在: {func_name}"
-                    }
-            else:
+            handler = self._ws_handlers.get(msg_type)
+            if handler is None:
                 return {"type": "error", "error": f"不支持的消息类型: {msg_type}"}
-                
+            return await handler(message)
         except Exception as e:
             return {"type": "error", "error": str(e)}
+
+    async def _ws_ping(self, message: Dict[str, Any]) -> str:
+        """心跳：固定结构的 pong 帧，时间戳为 Unix 毫秒整数"""
+        return _WS_PONG_PREFIX + str(time.time_ns() // 1_000_000) + "}"
+
+    async def _ws_function_call(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """调用注册的函数"""
+        func_name = message.get("function")
+        params = message.get("params", {})
+        
+        entry = self._api_cache.get(func_name)
+        if entry is None:
+            func = get_registered_api(func_name)
+            entry = (func, _is_coroutine_callable(func))
+            # 函数名由客户端提供，只缓存命中项，避免未知名称让缓存无限增长
+            if func is not None:
+                self._api_cache[func_name] = entry
+        func, is_coro = entry
+        if not func:
+            return {
+                "type": "function_result", 
+                "function": func_name,
+                "success": False,
+                "error": f"函数不存在: {func_name}"
+            }
+        
+        if is_coro:
+            result = await (func(**params) if params else func())
+        else:
+            # 同步函数放入线程池执行，避免阻塞事件循环上的其他连接
+            result = await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(func, **params) if params else func
+            )
+        return {
+            "type": "function_result",
+            "function": func_name,
+            "success": True,
+            "result": result
+        }
     
     async def broadcast_message(self, message: Dict[str, Any]):
-        """广播消息给所有WebSocket连接"""
+        """
+        广播消息给所有WebSocket连接（启用 Redis 时广播到所有进程）
+
+        broadcast_window_ms > 0 时，窗口内的多次广播合并为一个 JSON 数组，
+        只编码、投递一次；单条时仍按原消息发送。
+        """
+        window = self.config.broadcast_window_ms
+        if window <= 0:
+            await self._publish_broadcast(message)
+            return
+        if self._backplane is None and not self.websocket_connections:
+            return
+        self._pending_broadcast.append(message)
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_broadcasts(window / 1000))
+
+    async def _flush_broadcasts(self, delay: float):
+        """合并窗口结束后一次性发送窗口内积累的广播"""
+        await asyncio.sleep(delay)
+        batch, self._pending_broadcast = self._pending_broadcast, []
+        self._flush_task = None
+        try:
+            await self._publish_broadcast(batch[0] if len(batch) == 1 else batch)
+        except Exception as e:
+            logger.error(f"❌ 广播发送失败: {e}")
+
+    async def _publish_broadcast(self, message: Any):
+        """编码并投递一条广播（单条消息或合并后的消息数组）"""
+        if self._backplane is not None:
+            # 由各进程的订阅任务投递到本地连接（含本进程）
+            await self._backplane.publish(self.config.broadcast_channel, await self._encode_broadcast(message))
+            return
         if not self.websocket_connections:
             return
             
-        message_text = json.dumps(message)
-        disconnected = []
-        
-        for websocket in self.websocket_connections:
-            try:
-                await websocket.send_text(message_text)
-            except:
-                disconnected.append(websocket)
-        
-        # 移除断开的连接
-        for websocket in disconnected:
-            self.websocket_connections.remove(websocket)
+        # 只序列化一次，所有连接共享同一文本帧（per-message-deflate 仍按连接压缩）
+        self._deliver_local(await self._encode_broadcast(message), message)
+
+    async def _encode_broadcast(self, message: Any) -> str:
+        """
+        编码广播消息
+
+        广播内容通常来自同一数据源、体积相近：上一条超过 broadcast_offload_bytes 时，
+        本条改在专用线程中编码，避免大快照长时间占用事件循环。
+        """
+        threshold = self.config.broadcast_offload_bytes
+        if threshold and self._last_broadcast_size >= threshold:
+            if self._encode_executor is None:
+                self._encode_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ws-encode")
+            text = await asyncio.get_running_loop().run_in_executor(self._encode_executor, _dumps_text, message)
+        else:
+            text = _dumps_text(message)
+        self._last_broadcast_size = len(text)
+        return text
+
+    async def broadcast_message_threadsafe(self, message: Dict[str, Any], timeout: float = 5):
+        """
+        从任意事件循环广播消息
+
+        连接只能在服务器事件循环上操作；调用方位于其他循环（如后台启动时的主线程）时，
+        将广播投递到服务器循环执行并等待完成。
+        """
+        loop = self._server_loop
+        if loop is None or loop is asyncio.get_running_loop():
+            await self.broadcast_message(message)
+            return
+        future = self.submit_coroutine(self.broadcast_message(message))
+        await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+
+    def submit_coroutine(self, coro):
+        """
+        将协程提交到服务器事件循环执行（可从任意线程调用）
+
+        Returns:
+            concurrent.futures.Future，可用 result(timeout) 同步等待结果
+        """
+        loop = self._server_loop
+        if loop is None:
+            coro.close()
+            raise RuntimeError("API服务器未运行")
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    @contextlib.asynccontextmanager
+    async def _lifespan(self, app):
+        """
+        应用生命周期：记录服务器事件循环，供其他线程/事件循环投递广播；
+        配置了 broadcast_url 时同时启停 Redis 广播通道
+        """
+        self._server_loop = asyncio.get_running_loop()
+        if any(m.handler is Middleware.rate_limit_middleware for m in self.router.get_middlewares()):
+            self._rate_evict_task = self._server_loop.create_task(Middleware._rate_evict_loop())
+        backplane = self._backplane_enabled
+        if backplane:
+            await self._start_backplane()
+        try:
+            yield
+        finally:
+            if backplane:
+                await self._stop_backplane()
+            self._cancel_rate_evictor()
+            self._server_loop = None
+
+    def _cancel_rate_evictor(self):
+        """取消限流存储清理任务（可在任意线程调用）"""
+        task, self._rate_evict_task = self._rate_evict_task, None
+        if task is not None and not task.done():
+            loop = task.get_loop()
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(task.cancel)
+
+    def _deliver_local(self, message_text: str, message: Any = None):
+        """将已编码的文本帧投递给本进程的所有连接；入队为O(1)，不等待任何客户端"""
+        if message_text.startswith("["):
+            # 广播消息均为 JSON 对象，数组帧只可能来自合并窗口（含经 Redis 投递的其他进程广播），
+            # 标记后发送合并时展开其元素，避免嵌套数组
+            message_text = _BatchFrame(message_text)
+        packed = None
+        for client in tuple(self.websocket_connections):
+            if client.msgpack:
+                # MessagePack 帧同样每次广播只编码一次
+                if packed is None:
+                    packed = _packb(message if message is not None else _loads(message_text))
+                self._enqueue_websocket(client, packed)
+            else:
+                self._enqueue_websocket(client, message_text)
+
+    @staticmethod
+    def _encode_for(client: WebSocketClient, payload: Union[Dict[str, Any], str]) -> Union[str, bytes]:
+        """按连接协商的编码生成帧：响应字典或已编码的JSON文本 -> 文本帧 / MessagePack 帧"""
+        if client.msgpack:
+            return _packb(_loads(payload) if isinstance(payload, str) else payload)
+        return payload if isinstance(payload, str) else _dumps_text(payload)
+
+    async def _start_backplane(self):
+        """连接 Redis 并启动订阅任务"""
+        try:
+            self._backplane = aioredis.from_url(self.config.broadcast_url)
+            pubsub = self._backplane.pubsub()
+            await pubsub.subscribe(self.config.broadcast_channel)
+            self._backplane_task = asyncio.get_running_loop().create_task(self._run_backplane(pubsub))
+            logger.info(f"✓ 跨进程广播已启用: {self.config.broadcast_channel}")
+        except Exception as e:
+            logger.error(f"❌ 连接广播通道失败，仅广播到本进程连接: {e}")
+            self._backplane = None
+
+    async def _run_backplane(self, pubsub):
+        """订阅任务：将收到的广播投递给本进程连接"""
+        try:
+            async for item in pubsub.listen():
+                if item.get("type") != "message":
+                    continue
+                data = item["data"]
+                self._deliver_local(data.decode("utf-8") if isinstance(data, bytes) else data)
+        finally:
+            await pubsub.close()
+
+    async def _stop_backplane(self):
+        """停止订阅任务并关闭 Redis 连接"""
+        if self._backplane_task:
+            self._backplane_task.cancel()
+            self._backplane_task = None
+        if self._backplane is not None:
+            await self._backplane.close()
+            self._backplane = None
+
+    def _enqueue_websocket(self, client: WebSocketClient, frame: Union[str, bytes]):
+        """将帧放入连接的发送队列；队列已满说明客户端过慢，直接断开"""
+        try:
+            client.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            logger.warning("⚠️ WebSocket发送队列已满，断开慢速客户端")
+            self._drop_websocket_client(client)
+
+    def _drop_websocket_client(self, client: WebSocketClient):
+        """移除连接并停止其写任务"""
+        self.websocket_connections.discard(client)
+        if client.writer_task and not client.writer_task.done():
+            client.writer_task.cancel()
+        try:
+            asyncio.get_running_loop().create_task(client.websocket.close(code=1013))
+        except RuntimeError:
+            pass
+
+    async def _websocket_writer(self, client: WebSocketClient):
+        """连接专属写任务：串行消费发送队列"""
+        websocket = client.websocket
+        queue = client.queue
+        # 合并为 JSON 数组帧仅适用于文本连接
+        window = 0 if client.msgpack else self.config.websocket_coalesce_ms / 1000
+        timeout = self.config.websocket_send_timeout
+        send = websocket.send_bytes if client.msgpack else websocket.send_text
+        try:
+            while True:
+                frame = await queue.get()
+                if window > 0:
+                    # 等待合并窗口后取出所有排队消息，多条时以数组帧一次发送
+                    await asyncio.sleep(window)
+                    batch = [frame]
+                    while not queue.empty():
+                        batch.append(queue.get_nowait())
+                    if len(batch) > 1:
+                        # 已合并的数组帧展开元素，保证客户端始终收到一层消息数组
+                        parts = [f[1:-1] if isinstance(f, _BatchFrame) else f for f in batch]
+                        frame = "[" + ",".join(p for p in parts if p) + "]"
+                if timeout > 0:
+                    await asyncio.wait_for(send(frame), timeout)
+                else:
+                    await send(frame)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ WebSocket发送超时，断开慢速客户端")
+            self._drop_websocket_client(client)
+        except Exception:
+            # 发送失败视为连接已断开
+            self.websocket_connections.discard(client)
     
     def setup_static_files(self):
         """设置静态文件服务"""
@@ -854,31 +1700,107 @@ class APIGateway:
         else:
             logger.warning(f"⚠️ 静态文件目录不存在: {self.config.static_directory}")
     
+    def config_snapshot(self) -> Optional[Dict[str, Any]]:
+        """
+        网关配置的字典快照（按配置对象缓存）
+
+        配置对象不可变，asdict 只需为每个配置对象执行一次；每次返回缓存的
+        浅拷贝（列表字段同样复制），调用方修改结果不会污染缓存或后续调用。
+        """
+        if self.config is None:
+            return None
+        cached = self._config_snapshot
+        if cached is None or cached[0] is not self.config:
+            cached = self._config_snapshot = (self.config, asdict(self.config))
+        return {k: list(v) if isinstance(v, list) else v for k, v in cached[1].items()}
+
+    def info_snapshot(self) -> Dict[str, Any]:
+        """
+        网关信息（api_gateway.info 的结果）
+
+        计数与配置对象均未变化时复用上次构建的字典，高频轮询无需重复计算；
+        返回的是缓存的副本，调用方修改结果不会影响后续调用。
+        """
+        key = (self.router.endpoint_count(), self._middleware_count(), len(self.websocket_connections))
+        cached = self._info_snapshot
+        if cached is None or cached[0] != key or cached[1] is not self.config:
+            cached = self._info_snapshot = (key, self.config, {
+                "endpoints": key[0],
+                "middlewares": key[1],
+                "websocket_connections": key[2]
+            })
+        info = dict(cached[2])
+        info["config"] = self.config_snapshot()
+        return info
+
+    def _uvicorn_options(self) -> Dict[str, Any]:
+        """构建 uvicorn 启动参数（前台与后台共用）"""
+        return {
+            "host": self.config.host,
+            "port": self.config.port,
+            "log_level": "info",
+            "loop": _resolve_optional_impl("uvloop"),
+            "http": _resolve_optional_impl("httptools"),
+            "ws": _resolve_ws_impl(self.config.ws_impl),
+            "ws_per_message_deflate": self.config.ws_per_message_deflate,
+            "ws_max_size": self.config.ws_max_size,
+        }
+
+    def _raise_fd_limit(self):
+        """将 RLIMIT_NOFILE 软限制提高到 max_fds（不超过硬限制），避免大量连接时 accept 失败"""
+        try:
+            import resource
+        except ImportError:
+            return  # Windows 无此限制
+        try:
+            soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+            target = self.config.max_fds or 65536
+            if hard != resource.RLIM_INFINITY:
+                target = min(target, hard)
+            if target > soft:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+                logger.info(f"✓ 文件描述符上限: {soft} -> {target}")
+        except (ValueError, OSError) as e:
+            logger.warning(f"⚠️ 无法提高文件描述符上限: {e}")
+
+    def _bind_server_socket(self, config) -> socket.socket:
+        """预先绑定监听套接字，按配置设置 TCP_NODELAY 与收发缓冲区（Linux 上由已接受的连接继承）"""
+        sock = config.bind_socket()
+        if self.config.tcp_nodelay and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.config.socket_buffer_size > 0:
+            # 更大的缓冲区让内核每次唤醒可积累多个帧；显式设置会关闭该套接字的自动调节
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.config.socket_buffer_size)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.config.socket_buffer_size)
+        return sock
+
+    def prepare_app(self):
+        """完成函数发现、WebSocket、静态文件、路由与中间件挂载"""
+        self.discover_and_register_functions()
+        self.setup_websocket()
+        self.setup_static_files()
+        self._register_endpoints_to_fastapi()  # 重新注册以包含自动发现的端点
+        self._mount_router_middlewares()
+
     def start_server(self, background: bool = False):
         """启动API服务器"""
         if not self.app or not self.config:
             logger.error("❌ FastAPI未初始化或配置缺失，无法启动服务器")
             return
         
-        # 完成所有设置
-        self.discover_and_register_functions()
-        self.setup_websocket()
-        self.setup_static_files()
-        self._register_endpoints_to_fastapi()  # 重新注册以包含自动发现的端点
+        self._raise_fd_limit()
+        self.prepare_app()
+        options = self._uvicorn_options()
         
         if background:
             # 后台运行
             def run_server():
                 try:
                     import uvicorn
-                    config = uvicorn.Config(
-                        self.app,
-                        host=self.config.host,
-                        port=self.config.port,
-                        log_level="info"
-                    )
+                    config = uvicorn.Config(self.app, **options)
                     self._server = uvicorn.Server(config)
-                    asyncio.run(self._server.serve())
+                    # Server.run() 自行创建并管理本线程的事件循环
+                    self._server.run(sockets=[self._bind_server_socket(config)])
                 except Exception as e:
                     logger.error(f"❌ API服务器运行异常: {e}")
             
@@ -888,43 +1810,79 @@ class APIGateway:
         else:
             # 前台运行
             logger.info(f"🚀 API服务器启动: http://{self.config.host}:{self.config.port}")
-            uvicorn.run(self.app, host=self.config.host, port=self.config.port, log_level="info", reload=self.config.debug)
+            if self.config.workers > 1:
+                # 多进程需以导入路径启动：各工作进程按同一配置重建网关
+                os.environ[_WORKER_CONFIG_ENV] = json.dumps(asdict(self.config))
+                uvicorn.run(
+                    f"{__name__}:create_worker_app",
+                    factory=True,
+                    workers=self.config.workers,
+                    **options
+                )
+            elif self.config.debug:
+                uvicorn.run(self.app, reload=True, **options)
+            else:
+                # 与后台模式相同，使用预先绑定的监听套接字以应用套接字选项
+                config = uvicorn.Config(self.app, **options)
+                self._server = uvicorn.Server(config)
+                self._server.run(sockets=[self._bind_server_socket(config)])
     
-    def stop_server(self):
-        """停止API服务器"""
+    def _signal_server_exit(self):
+        """通知 uvicorn 退出（仅设置标志位，由服务器循环自行收尾）"""
+        if self._server:
+            self._server.should_exit = True
+            if hasattr(self._server, 'force_exit'):
+                self._server.force_exit = True
+            logger.info("✓ API服务器停止信号已发送")
+
+    def _finish_stop(self, thread: Optional[threading.Thread], timeout: float):
+        """服务器线程结束后的清理"""
+        if thread and thread.is_alive():
+            logger.warning(f"⚠️ API服务器线程未能在{timeout}秒内停止")
+        elif thread:
+            logger.info("✓ API服务器线程已停止")
+        
+        if self._encode_executor is not None:
+            self._encode_executor.shutdown(wait=False)
+            self._encode_executor = None
+        
+        # 清理WebSocket连接
+        if self.websocket_connections:
+            logger.info(f"🧹 清理 {len(self.websocket_connections)} 个WebSocket连接")
+            self.websocket_connections.clear()
+        
+        # 重置状态
+        self._server = None
+        self._server_thread = None
+        
+        logger.info("🛑 API服务器已完全停止")
+
+    def _joinable_server_thread(self) -> Optional[threading.Thread]:
+        """返回可等待的服务器线程；在服务器线程内部或由其处理的请求中调用时无法等待，返回 None"""
+        thread = self._server_thread
+        if _IN_GATEWAY_CALL.get():
+            return None
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            return thread
+        return None
+
+    def stop_server(self, timeout: float = 10):
+        """停止API服务器（同步等待服务器线程结束）"""
         try:
-            # 停止uvicorn服务器
-            if self._server:
-                self._server.should_exit = True
-                if hasattr(self._server, 'force_exit'):
-                    self._server.force_exit = True
-                logger.info("✓ API服务器停止信号已发送")
-            
-            # 等待服务器线程结束
-            if self._server_thread and self._server_thread.is_alive():
-                self._server_thread.join(timeout=10)
-                if self._server_thread.is_alive():
-                    logger.warning("⚠️ API服务器线程未能在10秒内停止")
-                else:
-                    logger.info("✓ API服务器线程已停止")
-            
-            # 清理WebSocket连接
-            if self.websocket_connections:
-                logger.info(f"🧹 清理 {len(self.websocket_connections)} 个WebSocket连接")
-                self.websocket_connections.clear()
-            
-            # 重置状态
-            self._server = None
-            self._server_thread = None
-            
-            logger.info("🛑 API服务器已完全停止")
-            
+            thread = self._joinable_server_thread()
+            self._signal_server_exit()
+            # force_exit 下 uvicorn 不执行 lifespan 关闭阶段，清理任务需在此取消
+            self._cancel_rate_evictor()
+            if thread:
+                thread.join(timeout=timeout)
+            self._finish_stop(thread, timeout)
         except Exception as e:
             logger.error(f"❌ 停止API服务器时出现异常: {e}")
 
 
 # 全局API网关实例
 _api_gateway_instance = None
+_api_gateway_lock = threading.Lock()
 
 def get_api_gateway(
     config: Optional[GatewayConfig] = None, 
@@ -934,16 +1892,31 @@ def get_api_gateway(
     """获取API网关单例"""
     global _api_gateway_instance
     if _api_gateway_instance is None:
-        _api_gateway_instance = APIGateway(config=config, config_file=config_file, project_config=project_config)
+        # 双重检查：仅首次创建时加锁，避免并发调用重复构建应用
+        with _api_gateway_lock:
+            if _api_gateway_instance is None:
+                _api_gateway_instance = APIGateway(config=config, config_file=config_file, project_config=project_config)
     return _api_gateway_instance
 
+def create_worker_app():
+    """
+    uvicorn 多进程工作进程的应用工厂
+
+    从环境变量读取主进程序列化的网关配置，加载 api/* 能力后构建应用。
+    多进程间的 WebSocket 广播需配置 broadcast_url（Redis）。
+    """
+    config_data = json.loads(os.environ.get(_WORKER_CONFIG_ENV, "{}"))
+    get_service_manager().load_project_modules()
+    gateway = get_api_gateway(config=GatewayConfig(**config_data))
+    gateway.prepare_app()
+    return gateway.app
+
 def create_api_gateway_for_project(project_config_path: str) -> APIGateway:
     """为特定项目创建API网关实例"""
     project_config_file = Path(project_config_path)
     if project_config_file.exists():
         try:
-            with open(project_config_file, 'r', encoding='utf-8') as f:
-                project_config = json.load(f)
+            project_config = _load_json_file(project_config_file)
             return APIGateway(project_config=project_config)
         except Exception as e:
             logger.error(f"❌ 加载项目配置失败: {e}")
@@ -965,7 +1938,7 @@ def start_api_gateway(
 
 @register_api(name="api_gateway.stop", outputs=["result"])
 def stop_api_gateway():
-    """停止API网关服务器"""
+    """停止API网关服务器（注册函数保持同步，供 FunctionRegistry.call 等同步调用方使用）"""
     gateway = get_api_gateway()
     gateway.stop_server()
     return {"status": "stopped"}
@@ -973,19 +1946,13 @@ def stop_api_gateway():
 @register_api(name="api_gateway.info", outputs=["info"])
 def get_api_gateway_info(config_file: Optional[str] = None):
     """获取API网关信息"""
-    gateway = get_api_gateway(config_file=config_file)
-    return {
-        "endpoints": len(gateway.router.get_endpoints()),
-        "middlewares": len(gateway.router.get_middlewares()), 
-        "websocket_connections": len(gateway.websocket_connections),
-        "config": gateway.config.__dict__ if gateway.config else None
-    }
+    return get_api_gateway(config_file=config_file).info_snapshot()
 
 @register_api(name="api_gateway.broadcast", outputs=["result"])
 async def broadcast_to_websockets(message: Dict[str, Any]):
     """向所有WebSocket连接广播消息"""
     gateway = get_api_gateway()
-    await gateway.broadcast_message(message)
+    await gateway.broadcast_message_threadsafe(message)
     return {"broadcasted": True, "connections": len(gateway.websocket_connections)}
 
 @register_api(name="api_gateway.create_for_project", outputs=["result"])
@@ -996,7 +1963,7 @@ def create_gateway_for_project(project_config_path: str):
         return {
             "success": True,
             "message": f"API网关已为项目配置创建: {project_config_path}",
-            "config": gateway.config.__dict__ if gateway.config else None
+            "config": gateway.config_snapshot()
         }
     except Exception as e:
         return {
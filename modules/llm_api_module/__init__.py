@@ -3,11 +3,16 @@
 提供统一的LLM API调用接口，支持多个提供商
 """
 
-from .llm_api_manager import LLMAPIManager, APIResponse, StreamChunk, APIConfiguration
+from .llm_api_manager import (
+    LLMAPIManager, APIResponse, StreamChunk, APIConfiguration,
+    get_response_cache_stats, clear_response_cache
+)
 
 __all__ = [
     'LLMAPIManager',
     'APIResponse',
     'StreamChunk',
-    'APIConfiguration'
+    'APIConfiguration',
+    'get_response_cache_stats',
+    'clear_response_cache'
 ]
\ No newline at end of file
@@ -4,28 +4,136 @@
 """
 
 import os
+import copy
 import json
 import time
 import asyncio
+import hashlib
+import threading
 import aiohttp
 import requests
-from typing import Dict, List, Any, Optional, Union, AsyncGenerator, Iterator
-from dataclasses import dataclass, field
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, List, Any, Optional, Union, AsyncGenerator, AsyncIterator, Callable, Iterable, Iterator, Tuple
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
 from enum import Enum
 import logging
+import sys
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
 
 from . import variables as v
 
 # 设置日志
 logger = logging.getLogger(__name__)
 
+def _dumps_bytes(obj: Any) -> bytes:
+    """将请求体序列化为JSON字节串（优先使用 orjson）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _loads(data: Union[str, bytes]) -> Any:
+    """解析JSON文本或字节串（优先使用 orjson）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class _LazyJSON:
+    """日志参数：仅在日志记录实际输出时才格式化为缩进JSON"""
+    __slots__ = ("data",)
+    
+    def __init__(self, data: Any):
+        self.data = data
+    
+    def __str__(self) -> str:
+        if orjson is not None:
+            try:
+                return orjson.dumps(self.data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode("utf-8")
+            except TypeError:
+                pass
+        return json.dumps(self.data, indent=2, ensure_ascii=False)
+
+# 同步请求的超时与连接异常（启用 HTTP/2 时包括 httpx 的异常）
+_TIMEOUT_ERRORS = (requests.exceptions.Timeout,) + ((httpx.TimeoutException,) if httpx is not None else ())
+_CONNECTION_ERRORS = (requests.exceptions.ConnectionError,) + ((httpx.TransportError,) if httpx is not None else ())
+
+# 允许的消息角色
+_ALLOWED_ROLES = frozenset({"system", "user", "assistant"})
+# 估算请求大小时每条消息的JSON结构开销（键名、引号、分隔符）
+_MESSAGE_OVERHEAD = 32
+
+# SSE 行前缀与 OpenAI 的流结束数据（均以字节比较，不解码整行）
+_SSE_DATA_PREFIX = b"data: "
+_SSE_DATA_OFFSET = len(_SSE_DATA_PREFIX)
+_SSE_DONE_MARKER = b"[DONE]"
+# _parse_sse_line 遇到流结束数据时返回的标记
+_SSE_DONE = object()
+
+def _parse_sse_line(line: bytes) -> Any:
+    """
+    解析一行 SSE 数据
+
+    返回 data 行的 JSON 对象；流结束标记返回 _SSE_DONE；
+    空行、event 等非 data 行以及无法解析的数据返回 None。
+    """
+    if not line.startswith(_SSE_DATA_PREFIX):
+        return None
+    # 行尾的回车符等空白由JSON解析器忽略，无需 strip 复制
+    data = line[_SSE_DATA_OFFSET:]
+    if not data or data.isspace():
+        return None
+    if data.startswith(_SSE_DONE_MARKER) and data.rstrip() == _SSE_DONE_MARKER:
+        return _SSE_DONE
+    try:
+        return _loads(data)
+    except json.JSONDecodeError:  # orjson.JSONDecodeError 是其子类
+        return None
+
+def _split_lines(buffer: bytes, chunk: bytes) -> Tuple[List[bytes], bytes]:
+    """将新读取的字节块接到上次剩余的半行之后按行切分，返回 (完整行, 剩余半行)"""
+    lines = (buffer + chunk if buffer else chunk).split(b"\n")
+    return lines, lines.pop()
+
+def _iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """将任意切分的字节块重组为行（行尾的回车符由 _parse_sse_line 去除）"""
+    buffer = b""
+    for chunk in chunks:
+        lines, buffer = _split_lines(buffer, chunk)
+        yield from lines
+    if buffer:
+        yield buffer
+
+async def _aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """_iter_lines 的异步版本"""
+    buffer = b""
+    async for chunk in chunks:
+        lines, buffer = _split_lines(buffer, chunk)
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
 # ========== 数据类定义 ==========
 
+# Python 3.10+ 为高频创建的数据类启用 __slots__（无实例 __dict__，属性访问更快）
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
 class ResponseType(Enum):
     STREAMING = "streaming"
     NON_STREAMING = "non_streaming"
 
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class APIResponse:
     """API响应结果"""
     success: bool
@@ -38,7 +146,7 @@ class APIResponse:
     raw_response: Optional[Dict[str, Any]] = None
     provider: Optional[str] = None
 
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class StreamChunk:
     """流式响应块"""
     content: str
@@ -56,15 +164,166 @@ class APIConfiguration:
     timeout: int = v.DEFAULT_TIMEOUT
     connect_timeout: int = v.DEFAULT_CONNECT_TIMEOUT
     enable_logging: bool = False
+    # 同步调用使用 HTTP/2 多路复用（需安装 httpx[http2]，不可用时回退到 HTTP/1.1 连接池）
+    http2: bool = False
+    # 初始化时在后台预先建立到提供商的连接，首个请求无需等待 TCP/TLS 握手
+    prewarm: bool = False
+    # 在 APIResponse.raw_response 中保留完整的原始响应（默认不保留，减少长期持有响应时的内存）
+    keep_raw_response: bool = False
+
+# ========== 确定性响应缓存 ==========
+
+# 缓存键 -> (写入时间, 去除原始响应的 APIResponse)，按最近使用排序
+_RESPONSE_CACHE: "OrderedDict[str, Tuple[float, APIResponse]]" = OrderedDict()
+_RESPONSE_CACHE_LOCK = threading.Lock()
+_RESPONSE_CACHE_STATS = {"hits": 0, "misses": 0}
+
+def _response_cache_get(key: str) -> Optional[APIResponse]:
+    """读取未过期的缓存响应"""
+    now = time.monotonic()
+    with _RESPONSE_CACHE_LOCK:
+        entry = _RESPONSE_CACHE.get(key)
+        if entry is not None and now - entry[0] < v.RESPONSE_CACHE_TTL:
+            _RESPONSE_CACHE.move_to_end(key)
+            _RESPONSE_CACHE_STATS["hits"] += 1
+            return entry[1]
+        if entry is not None:
+            del _RESPONSE_CACHE[key]
+        _RESPONSE_CACHE_STATS["misses"] += 1
+        return None
+
+def _response_cache_put(key: str, response: APIResponse):
+    """写入成功的响应，超出容量时淘汰最久未使用的条目"""
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE[key] = (time.monotonic(), replace(response, raw_response=None))
+        _RESPONSE_CACHE.move_to_end(key)
+        while len(_RESPONSE_CACHE) > v.RESPONSE_CACHE_MAX_ENTRIES:
+            _RESPONSE_CACHE.popitem(last=False)
+
+def get_response_cache_stats() -> Dict[str, int]:
+    """获取响应缓存的命中统计"""
+    with _RESPONSE_CACHE_LOCK:
+        return {**_RESPONSE_CACHE_STATS, "entries": len(_RESPONSE_CACHE)}
+
+def clear_response_cache():
+    """清空响应缓存"""
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE.clear()
+
+# ========== 模型列表缓存 ==========
+
+# (提供商, 基础URL, 密钥摘要, 分页参数) -> (写入时间, 结果, ETag)
+_MODELS_CACHE: Dict[Tuple[Any, ...], Tuple[float, Dict[str, Any], Optional[str]]] = {}
+_MODELS_CACHE_LOCK = threading.Lock()
+
+def _copy_models_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """复制模型列表结果（含 data 列表与 raw_response），调用方修改返回值不会影响缓存"""
+    return copy.deepcopy(result)
+
+# 进行中的模型列表请求：相同缓存键的并发调用等待同一次网络请求（异步键额外包含事件循环）
+_MODELS_INFLIGHT: Dict[Tuple[Any, ...], "Future[Dict[str, Any]]"] = {}
+_MODELS_INFLIGHT_ASYNC: Dict[Tuple[Any, ...], "asyncio.Future[Dict[str, Any]]"] = {}
 
 # ========== 核心LLM API管理器类 ==========
 
 class LLMAPIManager:
     """通用LLM API管理器"""
     
+    # 异步调用共享的 aiohttp 会话：id(事件循环) -> (事件循环, 会话)
+    _aio_sessions: Dict[int, Tuple[asyncio.AbstractEventLoop, aiohttp.ClientSession]] = {}
+    # call_api_in_pool 使用的共享线程池（首次使用时创建）
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+    
     def __init__(self, config: APIConfiguration):
         self.config = config
         self._setup_logging()
+        self._session = self._create_session()
+        self._http2_client = self._create_http2_client() if config.http2 else None
+        self._bind_provider_handlers()
+        # 请求头与URL片段缓存：((提供商, 密钥, 基础URL), 请求头, URL前缀, 流式后缀, 非流式后缀)
+        self._request_parts: Optional[Tuple[Tuple[str, str, str], Dict[str, str], str, str, str]] = None
+        self._warmed = False
+        if config.prewarm and self.is_available():
+            threading.Thread(target=self._prewarm, name="llm-api-prewarm", daemon=True).start()
+    
+    def _create_session(self) -> requests.Session:
+        """创建带连接池的HTTP会话，后续请求复用 TCP/TLS 连接"""
+        session = requests.Session()
+        retry = Retry(
+            total=v.HTTP_MAX_RETRIES,
+            backoff_factor=v.HTTP_RETRY_BACKOFF,
+            status_forcelist=v.HTTP_RETRY_STATUS,
+            raise_on_status=False  # 重试耗尽后返回最后的响应，由 _handle_error 处理
+        )
+        adapter = HTTPAdapter(
+            pool_connections=v.HTTP_POOL_CONNECTIONS,
+            pool_maxsize=v.HTTP_POOL_MAXSIZE,
+            max_retries=retry
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    def _create_http2_client(self) -> Optional["httpx.Client"]:
+        """创建 HTTP/2 客户端，并发请求复用同一连接；依赖缺失时返回 None"""
+        if httpx is None:
+            logger.warning("未安装 httpx，HTTP/2 不可用，使用 HTTP/1.1 连接池")
+            return None
+        try:
+            return httpx.Client(
+                http2=True,
+                timeout=httpx.Timeout(self.config.timeout, connect=self.config.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=v.HTTPX_MAX_CONNECTIONS,
+                    max_keepalive_connections=v.HTTPX_MAX_KEEPALIVE_CONNECTIONS
+                )
+            )
+        except ImportError:
+            logger.warning("未安装 h2，HTTP/2 不可用，使用 HTTP/1.1 连接池")
+            return None
+    
+    def _prewarm(self):
+        """向提供商发送轻量 HEAD 请求，将建立好的连接留在连接池中"""
+        if self._warmed:
+            return
+        # Gemini 的请求URL携带API密钥，预热只访问基础地址
+        if self.config.provider == 'gemini':
+            url = self.config.base_url.rstrip('/')
+        else:
+            url = self._get_request_parts()[2]
+        try:
+            if self._http2_client is not None:
+                self._http2_client.head(url, timeout=httpx.Timeout(v.PREWARM_TIMEOUT, connect=self.config.connect_timeout))
+            else:
+                # requests.Session 不保证线程安全：预热线程不经过会话（Cookie 等状态），
+                # 直接通过会话挂载的适配器发送，建立的连接仍归还到共享连接池
+                adapter = self._session.get_adapter(url)
+                response = adapter.send(
+                    requests.Request('HEAD', url).prepare(),
+                    timeout=(self.config.connect_timeout, v.PREWARM_TIMEOUT)
+                )
+                response.content  # 读完响应，连接才会归还连接池
+            self._warmed = True
+        except Exception as e:
+            logger.debug(f"连接预热失败 ({self.config.provider}): {e}")
+    
+    def close(self):
+        """关闭HTTP会话，释放连接池"""
+        self._session.close()
+        if self._http2_client is not None:
+            self._http2_client.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    def __del__(self):
+        for client in (getattr(self, "_session", None), getattr(self, "_http2_client", None)):
+            if client is not None:
+                client.close()
     
     def _setup_logging(self):
         """设置日志配置"""
@@ -73,6 +332,10 @@ class LLMAPIManager:
         else:
             logging.basicConfig(level=getattr(logging, v.DEFAULT_LOG_LEVEL))
     
+    def _verbose(self) -> bool:
+        """是否输出详细日志：需启用 enable_logging 且日志级别允许 INFO"""
+        return self.config.enable_logging and logger.isEnabledFor(logging.INFO)
+    
     def get_available_models(self) -> List[str]:
         """获取可用模型列表"""
         return self.config.models or v.DEFAULT_MODELS.get(self.config.provider, [])
@@ -85,7 +348,35 @@ class LLMAPIManager:
             self.config.base_url != ''
         )
     
+    def _get_request_parts(self) -> Tuple[Tuple[str, str, str], Dict[str, str], str, str, str]:
+        """
+        获取缓存的请求头与URL片段
+
+        二者只取决于提供商、API密钥与基础URL，三者不变时复用上次构建的结果。
+        """
+        config = self.config
+        key = (config.provider, config.api_key, config.base_url)
+        parts = self._request_parts
+        if parts is None or parts[0] != key:
+            base_url = config.base_url.rstrip('/')
+            if config.provider == 'gemini':
+                # Gemini使用特殊的URL格式，并以API密钥作为URL参数：{前缀}{模型}{后缀}
+                prefix = f"{base_url}/models/"
+                stream_suffix = f":streamGenerateContent?key={config.api_key}"
+                suffix = f":generateContent?key={config.api_key}"
+            elif config.provider == 'anthropic':
+                prefix, stream_suffix, suffix = f"{base_url}/messages", "", ""
+            else:
+                # OpenAI、openai_compatible和其他兼容提供商
+                prefix, stream_suffix, suffix = f"{base_url}/chat/completions", "", ""
+            parts = self._request_parts = (key, self._build_headers(), prefix, stream_suffix, suffix)
+        return parts
+    
     def _get_headers(self) -> Dict[str, str]:
+        """获取请求头（缓存的共享字典，调用方不应修改）"""
+        return self._get_request_parts()[1]
+    
+    def _build_headers(self) -> Dict[str, str]:
         """构建请求头"""
         headers = {
             "Content-Type": "application/json",
@@ -110,41 +401,73 @@ class LLMAPIManager:
         
         return headers
     
-    def _build_request_payload(self, messages: List[Dict[str, str]],
-                             model: str,
-                             max_tokens: int = 2048,
-                             temperature: float = 0.7,
-                             stream: bool = False,
-                             **kwargs) -> Dict[str, Any]:
-        """构建API请求体"""
-        
-        if self.config.provider == 'gemini':
-            return self._build_gemini_payload(messages, model, max_tokens, temperature, stream, **kwargs)
-        elif self.config.provider == 'anthropic':
-            return self._build_anthropic_payload(messages, model, max_tokens, temperature, stream, **kwargs)
-        
+    def _bind_provider_handlers(self):
+        """
+        按提供商绑定请求URL、请求体构建、响应解析、流式事件处理与模型列表方法
+
+        管理器的提供商在生命周期内固定，初始化时选定一次，调用时无需逐次判断。
+        """
+        provider = self.config.provider
+        if provider == 'gemini':
+            self._get_request_url = self._get_gemini_request_url
+            self._build_request_payload = self._build_gemini_payload
+            self._handle_response_data = self._handle_gemini_response
+            self._handle_stream_event = self._handle_gemini_stream_event
+            self._models_request = self._gemini_models_request
+            self._models_result = self._gemini_models_result
+        elif provider == 'anthropic':
+            self._build_request_payload = self._build_anthropic_payload
+            self._handle_response_data = self._handle_anthropic_response
+            self._handle_stream_event = self._handle_anthropic_stream_event
+            self._models_request = self._anthropic_models_request
+            self._models_result = self._anthropic_models_result
+        else:
+            # 标准OpenAI格式（适用于OpenAI、openai_compatible和大多数自定义提供商）
+            self._build_request_payload = self._build_openai_payload
+            self._handle_response_data = self._handle_openai_response
+            self._handle_stream_event = self._handle_openai_stream_event
+            self._models_request = self._openai_models_request
+            self._models_result = self._openai_models_result
+    
+    def _build_openai_payload(self, messages: List[Dict[str, str]],
+                              model: str,
+                              max_tokens: int = 2048,
+                              temperature: float = 0.7,
+                              stream: bool = False,
+                              **kwargs) -> Dict[str, Any]:
+        """构建OpenAI格式的请求体"""
         # 标准OpenAI格式（适用于OpenAI、openai_compatible和大多数自定义提供商）
+        # 值为 None 的字段不写入请求体
         payload = {
             "messages": messages,
             "model": model,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-            "top_p": kwargs.get("top_p", 1.0),
-            "stream": stream,
-            "presence_penalty": kwargs.get("presence_penalty", 0.0),
-            "frequency_penalty": kwargs.get("frequency_penalty", 0.0)
+            "stream": stream
         }
-        
-        # 合并自定义字段（如果有的话）
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        if temperature is not None:
+            payload["temperature"] = temperature
+        top_p = kwargs.get("top_p", 1.0)
+        if top_p is not None:
+            payload["top_p"] = top_p
+        presence_penalty = kwargs.get("presence_penalty", 0.0)
+        if presence_penalty is not None:
+            payload["presence_penalty"] = presence_penalty
+        frequency_penalty = kwargs.get("frequency_penalty", 0.0)
+        if frequency_penalty is not None:
+            payload["frequency_penalty"] = frequency_penalty
+        
+        # 合并自定义字段（如果有的话），值为 None 时移除对应的默认字段
         custom_params = kwargs.get("custom_params", {})
         if custom_params:
-            payload.update(custom_params)
-        
-        # 移除None值
-        payload = {k: v for k, v in payload.items() if v is not None}
+            for key, value in custom_params.items():
+                if value is None:
+                    payload.pop(key, None)
+                else:
+                    payload[key] = value
         
-        if self.config.enable_logging:
-            logger.info(f"构建请求体: {json.dumps(payload, indent=2, ensure_ascii=False)}")
+        if self._verbose():
+            logger.info("构建请求体: %s", _LazyJSON(payload))
         
         return payload
     
@@ -155,32 +478,25 @@ class LLMAPIManager:
                             stream: bool = False,
                             **kwargs) -> Dict[str, Any]:
         """构建Gemini特定的请求体"""
-        # 分离系统消息和对话消息
-        system_instruction = None
-        conversation_messages = []
+        # 单次遍历分离系统消息，并将对话消息转换为Gemini格式
+        system_parts = []
+        gemini_contents = []
+        add_system = system_parts.append
+        add_content = gemini_contents.append
         
         for msg in messages:
-            if msg["role"] == "system":
-                # 如果有多个system消息，合并它们
-                if system_instruction:
-                    system_instruction += "\n\n" + msg["content"]
-                else:
-                    system_instruction = msg["content"]
+            role = msg["role"]
+            if role == "system":
+                add_system(msg["content"])
             else:
-                conversation_messages.append(msg)
+                # Gemini角色映射: user -> user, assistant -> model
+                add_content({
+                    "role": "model" if role == "assistant" else "user",
+                    "parts": [{"text": msg["content"]}]
+                })
         
-        # 转换消息格式为Gemini格式
-        gemini_contents = []
-        for msg in conversation_messages:
-            role = msg["role"]
-            content = msg["content"]
-            
-            # Gemini角色映射: user -> user, assistant -> model
-            gemini_role = "model" if role == "assistant" else "user"
-            gemini_contents.append({
-                "role": gemini_role,
-                "parts": [{"text": content}]
-            })
+        # 多个system消息合并为一条系统指令
+        system_instruction = "\n\n".join(system_parts) if system_parts else None
         
         # 构建Gemini请求体 - 使用新的顶层参数格式
         payload = {
@@ -221,8 +537,8 @@ class LLMAPIManager:
                 else:
                     payload[key] = value
         
-        if self.config.enable_logging:
-            logger.info(f"构建Gemini请求体: {json.dumps(payload, indent=2, ensure_ascii=False)}")
+        if self._verbose():
+            logger.info("构建Gemini请求体: %s", _LazyJSON(payload))
         
         return payload
     
@@ -233,15 +549,17 @@ class LLMAPIManager:
                                stream: bool = False,
                                **kwargs) -> Dict[str, Any]:
         """构建Anthropic特定的请求体"""
-        # 分离系统消息和对话消息
+        # 单次遍历分离系统消息和对话消息
         system_messages = []
         conversation_messages = []
+        add_system = system_messages.append
+        add_message = conversation_messages.append
         
         for msg in messages:
             if msg["role"] == "system":
-                system_messages.append(msg["content"])
+                add_system(msg["content"])
             else:
-                conversation_messages.append(msg)
+                add_message(msg)
         
         # 构建Anthropic请求体
         payload = {
@@ -277,8 +595,8 @@ class LLMAPIManager:
         if custom_params:
             payload.update(custom_params)
         
-        if self.config.enable_logging:
-            logger.info(f"构建Anthropic请求体: {json.dumps(payload, indent=2, ensure_ascii=False)}")
+        if self._verbose():
+            logger.info("构建Anthropic请求体: %s", _LazyJSON(payload))
         
         return payload
     
@@ -287,39 +605,112 @@ class LLMAPIManager:
         if not messages:
             raise ValueError("消息列表不能为空")
         
+        # 单次遍历完成校验与大小估算：文本内容按 UTF-8 长度计，加上每条消息的结构开销；
+        # 非文本内容（如多模态分段列表）才需要序列化计算
+        request_size = 0
         for msg in messages:
             if not isinstance(msg, dict):
                 raise ValueError("消息必须是字典格式")
             if "role" not in msg or "content" not in msg:
                 raise ValueError("消息必须包含'role'和'content'字段")
-            if msg["role"] not in ["system", "user", "assistant"]:
-                raise ValueError(f"无效的角色: {msg['role']}")
-        
-        # 检查请求大小
-        request_size = len(json.dumps(messages, ensure_ascii=False).encode('utf-8'))
-        if request_size > v.MAX_REQUEST_SIZE:
-            raise ValueError(f"请求大小超过限制: {request_size} > {v.MAX_REQUEST_SIZE}")
+            role = msg["role"]
+            if role not in _ALLOWED_ROLES:
+                raise ValueError(f"无效的角色: {role}")
+            
+            content = msg["content"]
+            if isinstance(content, str):
+                request_size += len(content.encode('utf-8'))
+            else:
+                request_size += len(_dumps_bytes(content))
+            request_size += len(role) + _MESSAGE_OVERHEAD
+            if request_size > v.MAX_REQUEST_SIZE:
+                raise ValueError(f"请求大小超过限制: {request_size} > {v.MAX_REQUEST_SIZE}")
         
         return True
     
     def _get_request_url(self, model: str, stream: bool = False) -> str:
-        """构建请求URL"""
-        base_url = self.config.base_url.rstrip('/')
+        """构建请求URL（除Gemini外URL与模型无关）"""
+        return self._get_request_parts()[2]
+    
+    def _get_gemini_request_url(self, model: str, stream: bool = False) -> str:
+        """构建Gemini请求URL：模型与操作位于路径中"""
+        _, _, prefix, stream_suffix, suffix = self._get_request_parts()
+        return f"{prefix}{model}{stream_suffix if stream else suffix}"
+    
+    def _prepare_request(self, messages: List[Dict[str, str]],
+                         model: Optional[str],
+                         max_tokens: int,
+                         temperature: float,
+                         stream: bool,
+                         start_time: float,
+                         **kwargs) -> Union[APIResponse, Tuple[str, Dict[str, str], Dict[str, Any]]]:
+        """检查可用性、选择模型并构建请求；无法调用时返回失败的 APIResponse"""
+        # 检查是否可用
+        if not self.is_available():
+            return APIResponse(
+                success=False,
+                error=f"API提供商 {self.config.provider} 不可用或未正确配置",
+                response_time=time.time() - start_time,
+                provider=self.config.provider
+            )
         
-        if self.config.provider == 'gemini':
-            # Gemini使用特殊的URL格式
-            if stream:
-                url = f"{base_url}/models/{model}:streamGenerateContent"
-            else:
-                url = f"{base_url}/models/{model}:generateContent"
-            # Gemini使用API密钥作为URL参数
-            url += f"?key={self.config.api_key}"
-            return url
-        elif self.config.provider == 'anthropic':
-            return f"{base_url}/messages"
-        else:
-            # OpenAI、openai_compatible和其他兼容提供商
-            return f"{base_url}/chat/completions"
+        # 使用默认模型如果未指定
+        if not model:
+            available_models = self.get_available_models()
+            if not available_models:
+                return APIResponse(
+                    success=False,
+                    error=f"提供商 {self.config.provider} 没有可用的模型",
+                    response_time=time.time() - start_time,
+                    provider=self.config.provider
+                )
+            model = available_models[0]
+        
+        # 验证请求
+        self._validate_request(messages)
+        
+        # 构建请求
+        url = self._get_request_url(model, stream)
+        headers = self._get_headers()
+        payload = self._build_request_payload(messages, model, max_tokens, temperature, stream, **kwargs)
+        return url, headers, payload
+    
+    def _response_cache_key(self, messages: List[Dict[str, str]],
+                            model: Optional[str],
+                            max_tokens: int,
+                            temperature: float,
+                            stream: bool,
+                            kwargs: Dict[str, Any]) -> Optional[str]:
+        """
+        计算响应缓存键
+
+        缓存需调用方以 cacheable=True 显式开启，且仅适用于非流式调用；
+        即使 temperature == 0，托管模型的输出也不保证一致，因此不会自动缓存。
+        缓存为进程级共享，键中包含 API 密钥摘要，不同密钥（租户）的结果互不可见。
+        """
+        cacheable = kwargs.pop("cacheable", False)
+        if stream or not cacheable:
+            return None
+        key_data = json.dumps({
+            "provider": self.config.provider,
+            "base_url": self.config.base_url,
+            "api_key": hashlib.blake2b(self.config.api_key.encode("utf-8"), digest_size=16).hexdigest(),
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "params": kwargs
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+    
+    def _cached_response(self, cache_key: Optional[str], start_time: float) -> Optional[APIResponse]:
+        """命中缓存时返回副本，并刷新本次调用的响应时间"""
+        if cache_key is None:
+            return None
+        cached = _response_cache_get(cache_key)
+        if cached is None:
+            return None
+        return replace(cached, response_time=time.time() - start_time)
     
     def call_api(self, messages: List[Dict[str, str]], 
                  model: str = None,
@@ -331,60 +722,154 @@ class LLMAPIManager:
         start_time = time.time()
         
         try:
-            # 检查是否可用
-            if not self.is_available():
-                return APIResponse(
-                    success=False,
-                    error=f"API提供商 {self.config.provider} 不可用或未正确配置",
-                    response_time=time.time() - start_time,
-                    provider=self.config.provider
-                )
+            cache_key = self._response_cache_key(messages, model, max_tokens, temperature, stream, kwargs)
+            cached = self._cached_response(cache_key, start_time)
+            if cached is not None:
+                return cached
             
-            # 使用默认模型如果未指定
-            if not model:
-                available_models = self.get_available_models()
-                if not available_models:
-                    return APIResponse(
-                        success=False,
-                        error=f"提供商 {self.config.provider} 没有可用的模型",
-                        response_time=time.time() - start_time,
-                        provider=self.config.provider
-                    )
-                model = available_models[0]
-            
-            # 验证请求
-            self._validate_request(messages)
-            
-            # 构建请求
-            url = self._get_request_url(model, stream)
-            headers = self._get_headers()
-            payload = self._build_request_payload(messages, model, max_tokens, temperature, stream, **kwargs)
+            prepared = self._prepare_request(messages, model, max_tokens, temperature, stream, start_time, **kwargs)
+            if isinstance(prepared, APIResponse):
+                return prepared
+            url, headers, payload = prepared
             
             # 发送请求
-            response = requests.post(
-                url,
-                headers=headers,
-                json=payload,
-                timeout=(self.config.connect_timeout, self.config.timeout),
-                stream=stream
+            body = _dumps_bytes(payload)
+            client = self._http2_client
+            if client is not None:
+                response = client.send(client.build_request("POST", url, headers=headers, content=body), stream=stream)
+                if response.is_error:
+                    response.read()
+                    return self._handle_error(response, start_time)
+            else:
+                response = self._session.post(
+                    url,
+                    headers=headers,
+                    data=body,
+                    timeout=(self.config.connect_timeout, self.config.timeout),
+                    stream=stream
+                )
+                if not response.ok:
+                    return self._handle_error(response, start_time)
+            
+            if stream:
+                return self._handle_streaming_response(response, start_time)
+            
+            result = self._handle_non_streaming_response(response, start_time)
+            if cache_key is not None and result.success:
+                _response_cache_put(cache_key, result)
+            return result
+                
+        except _TIMEOUT_ERRORS:
+            return APIResponse(
+                success=False,
+                error="请求超时",
+                response_time=time.time() - start_time,
+                provider=self.config.provider
+            )
+        except _CONNECTION_ERRORS:
+            return APIResponse(
+                success=False,
+                error="连接失败",
+                response_time=time.time() - start_time,
+                provider=self.config.provider
+            )
+        except Exception as e:
+            return APIResponse(
+                success=False,
+                error=f"未知错误: {str(e)}",
+                response_time=time.time() - start_time,
+                provider=self.config.provider
             )
+    
+    @classmethod
+    def _get_aio_session(cls) -> aiohttp.ClientSession:
+        """获取当前事件循环共享的 aiohttp 会话（按事件循环惰性创建，所有管理器共用连接池）"""
+        loop = asyncio.get_running_loop()
+        entry = cls._aio_sessions.get(id(loop))
+        if entry is None or entry[0] is not loop or entry[1].closed:
+            # 丢弃已关闭事件循环遗留的会话引用（其连接绑定在已关闭的循环上，无法跨循环关闭；
+            # 需要释放连接时应在所属循环关闭前调用 aclose）
+            for key, (old_loop, _) in list(cls._aio_sessions.items()):
+                if old_loop.is_closed():
+                    del cls._aio_sessions[key]
+            connector = aiohttp.TCPConnector(
+                limit=v.AIOHTTP_LIMIT,
+                limit_per_host=v.AIOHTTP_LIMIT_PER_HOST,
+                ttl_dns_cache=v.AIOHTTP_DNS_CACHE_TTL,
+                keepalive_timeout=v.AIOHTTP_KEEPALIVE_TIMEOUT
+            )
+            entry = (loop, aiohttp.ClientSession(connector=connector))
+            cls._aio_sessions[id(loop)] = entry
+        return entry[1]
+    
+    @classmethod
+    async def aclose(cls):
+        """
+        关闭当前事件循环的共享 aiohttp 会话
+
+        须在会话所属的事件循环上、该循环关闭之前调用（通常在应用关闭时）；
+        循环关闭后遗留的会话只会被丢弃引用，不会再关闭其连接。
+        """
+        entry = cls._aio_sessions.pop(id(asyncio.get_running_loop()), None)
+        if entry is not None and not entry[1].closed:
+            await entry[1].close()
+    
+    async def acall_api(self, messages: List[Dict[str, str]],
+                        model: str = None,
+                        max_tokens: int = 2048,
+                        temperature: float = 0.7,
+                        stream: bool = False,
+                        **kwargs) -> Union[APIResponse, AsyncIterator[StreamChunk]]:
+        """异步调用API（共享连接池，不阻塞事件循环）"""
+        start_time = time.time()
+        
+        try:
+            cache_key = self._response_cache_key(messages, model, max_tokens, temperature, stream, kwargs)
+            cached = self._cached_response(cache_key, start_time)
+            if cached is not None:
+                return cached
             
-            if not response.ok:
-                return self._handle_error(response, start_time)
+            prepared = self._prepare_request(messages, model, max_tokens, temperature, stream, start_time, **kwargs)
+            if isinstance(prepared, APIResponse):
+                return prepared
+            url, headers, payload = prepared
+            
+            # 与同步调用一致：timeout 为单次读取超时，而非整个流的总时长
+            timeout = aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=self.config.connect_timeout,
+                sock_read=self.config.timeout
+            )
+            response = await self._get_aio_session().post(url, headers=headers, data=_dumps_bytes(payload), timeout=timeout)
+            
+            if response.status >= 400:
+                try:
+                    error_data = _loads(await response.read())
+                except Exception:
+                    error_data = None
+                finally:
+                    response.release()
+                return self._build_error_response(response.status, error_data, start_time)
             
             if stream:
-                return self._handle_streaming_response(response, start_time)
-            else:
-                return self._handle_non_streaming_response(response, start_time)
+                return self._ahandle_streaming_response(response, start_time)
+            try:
+                body = await response.read()
+            finally:
+                response.release()
+            result = self._parse_response_body(body, start_time)
+            if cache_key is not None and result.success:
+                _response_cache_put(cache_key, result)
+            return result
                 
-        except requests.exceptions.Timeout:
+        except asyncio.TimeoutError:
             return APIResponse(
                 success=False,
                 error="请求超时",
                 response_time=time.time() - start_time,
                 provider=self.config.provider
             )
-        except requests.exceptions.ConnectionError:
+        except aiohttp.ClientConnectionError:
             return APIResponse(
                 success=False,
                 error="连接失败",
@@ -399,19 +884,81 @@ class LLMAPIManager:
                 provider=self.config.provider
             )
     
+    @classmethod
+    def _get_executor(cls) -> ThreadPoolExecutor:
+        """获取共享线程池"""
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(max_workers=v.EXECUTOR_MAX_WORKERS, thread_name_prefix="llm-api")
+        return cls._executor
+    
+    def call_api_in_pool(self, messages: List[Dict[str, str]], **kwargs) -> "Future[Union[APIResponse, Iterator[StreamChunk]]]":
+        """在共享线程池中执行 call_api，调用线程不等待网络IO；参数同 call_api"""
+        return self._get_executor().submit(self.call_api, messages, **kwargs)
+    
+    async def acall_api_via_pool(self, messages: List[Dict[str, str]], **kwargs) -> APIResponse:
+        """
+        在共享线程池中执行非流式 call_api 并异步等待结果
+
+        适用于需要同步传输（如 http2=True 的 HTTP/2 客户端）的异步调用方；
+        一般异步调用请使用 acall_api。
+        """
+        kwargs["stream"] = False
+        return await asyncio.wrap_future(self.call_api_in_pool(messages, **kwargs))
+    
+    def call_api_batch(self, prompt_sets: List[List[Dict[str, str]]],
+                       model: str = None,
+                       max_concurrency: int = v.BATCH_MAX_CONCURRENCY,
+                       **kwargs) -> List[APIResponse]:
+        """
+        并发调用多组消息（非流式），按输入顺序返回结果
+
+        各请求共享会话连接池，并发数不超过 max_concurrency；其余参数同 call_api。
+        """
+        if not prompt_sets:
+            return []
+        kwargs.pop("stream", None)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(prompt_sets))),
+                                thread_name_prefix="llm-api-batch") as executor:
+            return list(executor.map(
+                lambda messages: self.call_api(messages, model=model, stream=False, **kwargs),
+                prompt_sets
+            ))
+    
+    async def acall_api_batch(self, prompt_sets: List[List[Dict[str, str]]],
+                              model: str = None,
+                              max_concurrency: int = v.BATCH_MAX_CONCURRENCY,
+                              **kwargs) -> List[APIResponse]:
+        """call_api_batch 的异步版本：以信号量限制并发的 acall_api"""
+        kwargs.pop("stream", None)
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def call(messages: List[Dict[str, str]]) -> APIResponse:
+            async with semaphore:
+                return await self.acall_api(messages, model=model, stream=False, **kwargs)
+        
+        return list(await asyncio.gather(*(call(messages) for messages in prompt_sets)))
+    
     def _handle_error(self, response, start_time: float) -> APIResponse:
-        """处理API错误响应"""
-        error_msg = v.HTTP_ERROR_MESSAGES.get(response.status_code, f"HTTP {response.status_code}")
-        
+        """处理API错误响应（requests 或 httpx 响应），读取后关闭以归还连接"""
         try:
-            error_data = response.json()
-            if "error" in error_data:
-                if isinstance(error_data["error"], dict):
-                    error_msg = error_data["error"].get("message", error_msg)
-                else:
-                    error_msg = str(error_data["error"])
+            error_data = _loads(response.content)
         except:
-            pass
+            error_data = None
+        finally:
+            response.close()
+        return self._build_error_response(response.status_code, error_data, start_time)
+    
+    def _build_error_response(self, status_code: int, error_data: Any, start_time: float) -> APIResponse:
+        """根据状态码与错误响应体构建失败结果"""
+        error_msg = v.HTTP_ERROR_MESSAGES.get(status_code, f"HTTP {status_code}")
+        
+        if isinstance(error_data, dict) and "error" in error_data:
+            if isinstance(error_data["error"], dict):
+                error_msg = error_data["error"].get("message", error_msg)
+            else:
+                error_msg = str(error_data["error"])
         
         logger.error(f"API请求失败 ({self.config.provider}): {error_msg}")
         
@@ -424,19 +971,18 @@ class LLMAPIManager:
     
     def _handle_non_streaming_response(self, response, start_time: float) -> APIResponse:
         """处理非流式响应"""
+        return self._parse_response_body(response.content, start_time)
+    
+    def _parse_response_body(self, body: bytes, start_time: float) -> APIResponse:
+        """解析非流式响应体"""
         try:
-            data = response.json()
+            data = _loads(body)
             
-            if self.config.enable_logging:
-                logger.info(f"收到响应: {json.dumps(data, indent=2, ensure_ascii=False)}")
+            if self._verbose():
+                logger.info("收到响应: %s", _LazyJSON(data))
             
-            # 根据提供商处理不同的响应格式
-            if self.config.provider == 'gemini':
-                return self._handle_gemini_response(data, start_time)
-            elif self.config.provider == 'anthropic':
-                return self._handle_anthropic_response(data, start_time)
-            else:
-                return self._handle_openai_response(data, start_time)
+            # 按提供商的响应格式解析（初始化时绑定）
+            return self._handle_response_data(data, start_time)
             
         except json.JSONDecodeError:
             return APIResponse(
@@ -473,7 +1019,7 @@ class LLMAPIManager:
             response_time=time.time() - start_time,
             model_used=model_used,
             finish_reason=finish_reason,
-            raw_response=data,
+            raw_response=data if self.config.keep_raw_response else None,
             provider=self.config.provider
         )
     
@@ -512,7 +1058,7 @@ class LLMAPIManager:
             response_time=time.time() - start_time,
             model_used=model_used,
             finish_reason=finish_reason,
-            raw_response=data,
+            raw_response=data if self.config.keep_raw_response else None,
             provider=self.config.provider
         )
     
@@ -548,199 +1094,179 @@ class LLMAPIManager:
             response_time=time.time() - start_time,
             model_used=model_used,
             finish_reason=finish_reason,
-            raw_response=data,
+            raw_response=data if self.config.keep_raw_response else None,
             provider=self.config.provider
         )
     
     def _handle_streaming_response(self, response, start_time: float) -> Iterator[StreamChunk]:
-        """处理流式响应"""
+        """处理流式响应（requests 或 httpx 响应），结束后关闭响应以归还连接"""
         try:
-            # 根据提供商处理不同的流式响应格式
-            if self.config.provider == 'anthropic':
-                yield from self._handle_anthropic_streaming_response(response, start_time)
-            elif self.config.provider == 'gemini':
-                yield from self._handle_gemini_streaming_response(response, start_time)
+            handle_event = self._handle_stream_event
+            # 仅用于日志的总长度，无需拼接完整内容
+            total_length = 0
+            
+            if isinstance(response, requests.Response):
+                # 大块读取后自行切分行：分块传输时每个 HTTP 块到达即返回，不会等满整块
+                byte_chunks = response.iter_content(chunk_size=v.STREAM_CHUNK_SIZE)
             else:
-                yield from self._handle_openai_streaming_response(response, start_time)
+                # httpx 指定 chunk_size 时会攒满整块，逐帧读取
+                byte_chunks = response.iter_bytes()
+            
+            for line in _iter_lines(byte_chunks):
+                data = _parse_sse_line(line)
+                if data is None:
+                    continue
+                if data is _SSE_DONE:
+                    break
+                
+                chunks, finished = handle_event(data)
+                for chunk in chunks:
+                    total_length += len(chunk.content)
+                    yield chunk
+                if finished:
+                    break
+            
+            if self._verbose():
+                logger.info("%s流式响应完成，总长度: %d", self.config.provider, total_length)
                 
         except Exception as e:
             logger.error(f"流式响应处理失败: {str(e)}")
             yield StreamChunk(content="", finish_reason="error")
+        finally:
+            response.close()
     
-    def _handle_openai_streaming_response(self, response, start_time: float) -> Iterator[StreamChunk]:
-        """处理OpenAI格式的流式响应"""
-        full_content = ""
-        
-        for line in response.iter_lines():
-            if line:
-                line = line.decode('utf-8')
+    async def _ahandle_streaming_response(self, response, start_time: float) -> AsyncIterator[StreamChunk]:
+        """处理异步流式响应（aiohttp），结束后将连接归还连接池"""
+        try:
+            handle_event = self._handle_stream_event
+            # 仅用于日志的总长度，无需拼接完整内容
+            total_length = 0
+            
+            async for line in _aiter_lines(response.content.iter_any()):
+                data = _parse_sse_line(line)
+                if data is None:
+                    continue
+                if data is _SSE_DONE:
+                    break
+                
+                chunks, finished = handle_event(data)
+                for chunk in chunks:
+                    total_length += len(chunk.content)
+                    yield chunk
+                if finished:
+                    break
+            
+            if self._verbose():
+                logger.info("%s流式响应完成，总长度: %d", self.config.provider, total_length)
                 
-                if line.startswith('data: '):
-                    data_str = line[6:]  # 移除 'data: ' 前缀
-                    
-                    if data_str.strip() == '[DONE]':
-                        break
-                    
-                    try:
-                        data = json.loads(data_str)
-                        
-                        if "choices" in data and data["choices"]:
-                            choice = data["choices"][0]
-                            delta = choice.get("delta", {})
-                            
-                            if "content" in delta:
-                                content = delta["content"]
-                                full_content += content
-                                
-                                yield StreamChunk(
-                                    content=content,
-                                    finish_reason=choice.get("finish_reason")
-                                )
-                            
-                            # 检查是否完成
-                            if choice.get("finish_reason"):
-                                usage = data.get("usage")
-                                yield StreamChunk(
-                                    content="",
-                                    finish_reason=choice.get("finish_reason"),
-                                    usage=usage
-                                )
-                                break
-                                
-                    except json.JSONDecodeError:
-                        continue
+        except Exception as e:
+            logger.error(f"流式响应处理失败: {str(e)}")
+            yield StreamChunk(content="", finish_reason="error")
+        finally:
+            response.release()
+    
+    def _handle_openai_stream_event(self, data: Dict[str, Any]) -> Tuple[List[StreamChunk], bool]:
+        """处理OpenAI格式的流式事件，返回 (响应块列表, 是否结束)"""
+        chunks = []
         
-        if self.config.enable_logging:
-            logger.info(f"OpenAI流式响应完成，总长度: {len(full_content)}")
+        if "choices" in data and data["choices"]:
+            choice = data["choices"][0]
+            delta = choice.get("delta", {})
+            
+            if "content" in delta:
+                chunks.append(StreamChunk(
+                    content=delta["content"],
+                    finish_reason=choice.get("finish_reason")
+                ))
+            
+            # 检查是否完成
+            if choice.get("finish_reason"):
+                chunks.append(StreamChunk(
+                    content="",
+                    finish_reason=choice.get("finish_reason"),
+                    usage=data.get("usage")
+                ))
+                return chunks, True
+        
+        return chunks, False
     
-    def _handle_anthropic_streaming_response(self, response, start_time: float) -> Iterator[StreamChunk]:
-        """处理Anthropic格式的流式响应"""
-        full_content = ""
+    def _handle_anthropic_stream_event(self, data: Dict[str, Any]) -> Tuple[List[StreamChunk], bool]:
+        """处理Anthropic格式的流式事件，返回 (响应块列表, 是否结束)"""
+        event_type = data.get("type")
+        
+        if event_type == "content_block_delta":
+            delta = data.get("delta", {})
+            if delta.get("type") == "text_delta":
+                return [StreamChunk(content=delta.get("text", ""), finish_reason=None)], False
+        
+        elif event_type == "message_delta":
+            # 消息完成
+            stop_reason = data.get("delta", {}).get("stop_reason")
+            usage_data = data.get("usage", {})
+            
+            if stop_reason:
+                # 构建使用统计
+                usage = {
+                    "prompt_tokens": usage_data.get("input_tokens", 0),
+                    "completion_tokens": usage_data.get("output_tokens", 0),
+                    "total_tokens": usage_data.get("input_tokens", 0) + usage_data.get("output_tokens", 0)
+                }
+                return [StreamChunk(content="", finish_reason=stop_reason, usage=usage)], False
         
-        for line in response.iter_lines():
-            if line:
-                line = line.decode('utf-8')
-                
-                if line.startswith('event: '):
-                    event_type = line[7:].strip()  # 移除 'event: ' 前缀
-                elif line.startswith('data: '):
-                    data_str = line[6:]  # 移除 'data: ' 前缀
-                    
-                    if data_str.strip():
-                        try:
-                            data = json.loads(data_str)
-                            
-                            # 处理不同类型的事件
-                            if data.get("type") == "content_block_delta":
-                                delta = data.get("delta", {})
-                                if delta.get("type") == "text_delta":
-                                    content = delta.get("text", "")
-                                    full_content += content
-                                    
-                                    yield StreamChunk(
-                                        content=content,
-                                        finish_reason=None
-                                    )
-                            
-                            elif data.get("type") == "message_delta":
-                                # 消息完成
-                                delta = data.get("delta", {})
-                                stop_reason = delta.get("stop_reason")
-                                usage_data = data.get("usage", {})
-                                
-                                if stop_reason:
-                                    # 构建使用统计
-                                    usage = {
-                                        "prompt_tokens": usage_data.get("input_tokens", 0),
-                                        "completion_tokens": usage_data.get("output_tokens", 0),
-                                        "total_tokens": usage_data.get("input_tokens", 0) + usage_data.get("output_tokens", 0)
-                                    }
-                                    
-                                    yield StreamChunk(
-                                        content="",
-                                        finish_reason=stop_reason,
-                                        usage=usage
-                                    )
-                            
-                            elif data.get("type") == "message_stop":
-                                # 流式响应结束
-                                break
-                                
-                        except json.JSONDecodeError:
-                            continue
+        elif event_type == "message_stop":
+            # 流式响应结束
+            return [], True
         
-        if self.config.enable_logging:
-            logger.info(f"Anthropic流式响应完成，总长度: {len(full_content)}")
+        return [], False
     
-    def _handle_gemini_streaming_response(self, response, start_time: float) -> Iterator[StreamChunk]:
-        """处理Gemini格式的流式响应"""
-        full_content = ""
+    def _handle_gemini_stream_event(self, data: Dict[str, Any]) -> Tuple[List[StreamChunk], bool]:
+        """处理Gemini格式的流式事件，返回 (响应块列表, 是否结束)"""
+        chunks = []
         
-        for line in response.iter_lines():
-            if line:
-                line = line.decode('utf-8')
+        # Gemini流式响应格式
+        if "candidates" in data and data["candidates"]:
+            candidate = data["candidates"][0]
+            
+            if "content" in candidate and "parts" in candidate["content"]:
+                # 提取文本内容
+                content = "".join(part["text"] for part in candidate["content"]["parts"] if "text" in part)
+                if content:
+                    chunks.append(StreamChunk(content=content, finish_reason=None))
+            
+            # 检查完成状态
+            finish_reason = candidate.get("finishReason")
+            if finish_reason:
+                if finish_reason == "STOP":
+                    finish_reason = "end_turn"
+                
+                # 构建使用统计
+                usage = None
+                if "usageMetadata" in data:
+                    usage_metadata = data["usageMetadata"]
+                    usage = {
+                        "prompt_tokens": usage_metadata.get("promptTokenCount", 0),
+                        "completion_tokens": usage_metadata.get("candidatesTokenCount", 0),
+                        "total_tokens": usage_metadata.get("totalTokenCount", 0)
+                    }
                 
-                if line.startswith('data: '):
-                    data_str = line[6:]  # 移除 'data: ' 前缀
-                    
-                    if data_str.strip():
-                        try:
-                            data = json.loads(data_str)
-                            
-                            # Gemini流式响应格式
-                            if "candidates" in data and data["candidates"]:
-                                candidate = data["candidates"][0]
-                                
-                                if "content" in candidate and "parts" in candidate["content"]:
-                                    # 提取文本内容
-                                    parts = candidate["content"]["parts"]
-                                    content = ""
-                                    for part in parts:
-                                        if "text" in part:
-                                            content += part["text"]
-                                    
-                                    if content:
-                                        full_content += content
-                                        yield StreamChunk(
-                                            content=content,
-                                            finish_reason=None
-                                        )
-                                
-                                # 检查完成状态
-                                finish_reason = candidate.get("finishReason")
-                                if finish_reason:
-                                    if finish_reason == "STOP":
-                                        finish_reason = "end_turn"
-                                    
-                                    # 构建使用统计
-                                    usage = None
-                                    if "usageMetadata" in data:
-                                        usage_metadata = data["usageMetadata"]
-                                        usage = {
-                                            "prompt_tokens": usage_metadata.get("promptTokenCount", 0),
-                                            "completion_tokens": usage_metadata.get("candidatesTokenCount", 0),
-                                            "total_tokens": usage_metadata.get("totalTokenCount", 0)
-                                        }
-                                    
-                                    yield StreamChunk(
-                                        content="",
-                                        finish_reason=finish_reason,
-                                        usage=usage
-                                    )
-                                    break
-                                    
-                        except json.JSONDecodeError:
-                            continue
+                chunks.append(StreamChunk(content="", finish_reason=finish_reason, usage=usage))
+                return chunks, True
         
-        if self.config.enable_logging:
-            logger.info(f"Gemini流式响应完成，总长度: {len(full_content)}")
+        return chunks, False
     
-    def list_models(self, limit: Optional[int] = None, page_token: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+    def list_models(self, limit: Optional[int] = None, page_token: Optional[str] = None,
+                    force_refresh: bool = False, **kwargs) -> Dict[str, Any]:
         """获取可用模型列表
         
+        成功的结果按提供商、地址、密钥与分页参数缓存 MODELS_CACHE_TTL 秒；过期或
+        force_refresh 时若服务端提供了 ETag，则以 If-None-Match 条件请求重新验证，
+        304 时直接沿用缓存结果。请求超时或连接失败时回退到上一次成功的结果，
+        并附带 "stale": True。
+        
         Args:
             limit: 返回结果数量限制 (Anthropic: 1-1000, Gemini: 1-1000)
             page_token: 分页令牌 (Anthropic: before_id/after_id, Gemini: pageToken)
+            force_refresh: 忽略缓存，重新向提供商请求
             **kwargs: 其他分页参数
                 - before_id: Anthropic分页参数
                 - after_id: Anthropic分页参数
@@ -750,20 +1276,15 @@ class LLMAPIManager:
         """
         try:
             if not self.is_available():
-                return {
-                    "success": False,
-                    "error": f"API提供商 {self.config.provider} 不可用或未正确配置",
-                    "provider": self.config.provider
-                }
+                return self._models_unavailable_result()
             
-            # 构建请求URL和参数
-            if self.config.provider == 'anthropic':
-                return self._list_anthropic_models(limit, page_token, **kwargs)
-            elif self.config.provider == 'gemini':
-                return self._list_gemini_models(limit, page_token, **kwargs)
-            else:
-                # OpenAI和其他提供商通常使用标准endpoint
-                return self._list_openai_models(limit, page_token, **kwargs)
+            cache_key = self._models_cache_key(limit, page_token, kwargs)
+            if not force_refresh:
+                cached = self._cached_models(cache_key)
+                if cached is not None:
+                    return cached
+            
+            return self._fetch_models_shared(cache_key, limit, page_token, kwargs)
                 
         except Exception as e:
             logger.error(f"获取模型列表失败: {str(e)}")
@@ -773,8 +1294,171 @@ class LLMAPIManager:
                 "provider": self.config.provider
             }
     
-    def _list_anthropic_models(self, limit: Optional[int] = None, page_token: Optional[str] = None, **kwargs) -> Dict[str, Any]:
-        """获取Anthropic模型列表"""
+    async def alist_models(self, limit: Optional[int] = None, page_token: Optional[str] = None,
+                           force_refresh: bool = False, **kwargs) -> Dict[str, Any]:
+        """
+        异步获取可用模型列表，参数与返回值同 list_models
+        
+        复用当前事件循环共享的 aiohttp 会话，不阻塞事件循环；多个提供商的列表
+        可通过 asyncio.gather 并发获取，并与同步接口共用模型列表缓存。
+        """
+        try:
+            if not self.is_available():
+                return self._models_unavailable_result()
+            
+            cache_key = self._models_cache_key(limit, page_token, kwargs)
+            if not force_refresh:
+                cached = self._cached_models(cache_key)
+                if cached is not None:
+                    return cached
+            
+            return await self._afetch_models_shared(cache_key, limit, page_token, kwargs)
+            
+        except Exception as e:
+            logger.error(f"获取模型列表失败: {str(e)}")
+            return {
+                "success": False,
+                "error": f"获取模型列表失败: {str(e)}",
+                "provider": self.config.provider
+            }
+    
+    def _models_unavailable_result(self) -> Dict[str, Any]:
+        """提供商不可用时的模型列表结果"""
+        return {
+            "success": False,
+            "error": f"API提供商 {self.config.provider} 不可用或未正确配置",
+            "provider": self.config.provider
+        }
+    
+    def _models_cache_key(self, limit: Optional[int], page_token: Optional[str], kwargs: Dict[str, Any]) -> tuple:
+        """模型列表缓存键（密钥只保留摘要）"""
+        return (
+            self.config.provider,
+            self.config.base_url,
+            hashlib.blake2b(self.config.api_key.encode("utf-8"), digest_size=8).hexdigest(),
+            limit,
+            page_token,
+            tuple(sorted(kwargs.items()))
+        )
+    
+    def _cached_models(self, cache_key: tuple) -> Optional[Dict[str, Any]]:
+        """读取未过期的模型列表缓存，返回副本"""
+        with _MODELS_CACHE_LOCK:
+            entry = _MODELS_CACHE.get(cache_key)
+        if entry is not None and time.monotonic() - entry[0] < v.MODELS_CACHE_TTL:
+            return _copy_models_result(entry[1])
+        return None
+    
+    def _models_etag(self, cache_key: tuple) -> Optional[str]:
+        """已缓存模型列表的 ETag（用于 If-None-Match 条件请求）"""
+        with _MODELS_CACHE_LOCK:
+            entry = _MODELS_CACHE.get(cache_key)
+        return entry[2] if entry is not None else None
+    
+    def _store_models(self, cache_key: tuple, result: Optional[Dict[str, Any]], etag: Optional[str] = None) -> Dict[str, Any]:
+        """
+        缓存成功的模型列表结果，返回供调用方使用的副本
+        
+        result 为 None 表示服务端返回 304 未修改：沿用已缓存的结果并刷新写入时间。
+        超时或连接失败（无 status_code 的失败结果）时，若存在上一次成功的结果，
+        即使已过期也返回该结果并标记 "stale": True，而不是直接返回错误。
+        """
+        if result is None:
+            with _MODELS_CACHE_LOCK:
+                _, result, etag = _MODELS_CACHE[cache_key]
+                _MODELS_CACHE[cache_key] = (time.monotonic(), result, etag)
+            return _copy_models_result(result)
+        if result.get("success"):
+            with _MODELS_CACHE_LOCK:
+                _MODELS_CACHE[cache_key] = (time.monotonic(), _copy_models_result(result), etag)
+            return result
+        if "status_code" not in result:
+            with _MODELS_CACHE_LOCK:
+                entry = _MODELS_CACHE.get(cache_key)
+            if entry is not None:
+                logger.warning(f"获取模型列表失败（{result.get('error')}），返回缓存的旧结果")
+                stale = _copy_models_result(entry[1])
+                stale["stale"] = True
+                return stale
+        return result
+    
+    def _fetch_models_shared(self, cache_key: tuple, limit: Optional[int], page_token: Optional[str],
+                             kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """请求并缓存模型列表；其他线程正在请求相同列表时等待并共享其结果"""
+        with _MODELS_CACHE_LOCK:
+            future = _MODELS_INFLIGHT.get(cache_key)
+            owner = future is None
+            if owner:
+                future = _MODELS_INFLIGHT[cache_key] = Future()
+        
+        if not owner:
+            try:
+                return _copy_models_result(future.result())
+            except CancelledError:
+                # 发起请求的线程异常退出，自行请求
+                return self._store_models(cache_key, *self._fetch_models(limit, page_token, kwargs, self._models_etag(cache_key)))
+        
+        try:
+            result = self._store_models(cache_key, *self._fetch_models(limit, page_token, kwargs, self._models_etag(cache_key)))
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            # 等待方各自复制共享结果，发起方返回的对象不与它们共享
+            future.set_result(_copy_models_result(result))
+            return result
+        finally:
+            with _MODELS_CACHE_LOCK:
+                _MODELS_INFLIGHT.pop(cache_key, None)
+    
+    async def _afetch_models_shared(self, cache_key: tuple, limit: Optional[int], page_token: Optional[str],
+                                    kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """异步请求并缓存模型列表；同一事件循环内相同列表的并发请求共享一次网络请求"""
+        loop = asyncio.get_running_loop()
+        key = (id(loop),) + cache_key
+        future = _MODELS_INFLIGHT_ASYNC.get(key)
+        
+        if future is not None:
+            try:
+                return _copy_models_result(await asyncio.shield(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # 发起请求的协程被取消，自行请求
+                return self._store_models(cache_key, *await self._afetch_models(limit, page_token, kwargs, self._models_etag(cache_key)))
+        
+        future = _MODELS_INFLIGHT_ASYNC[key] = loop.create_future()
+        try:
+            result = self._store_models(cache_key, *await self._afetch_models(limit, page_token, kwargs, self._models_etag(cache_key)))
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            # 等待方各自复制共享结果，发起方返回的对象不与它们共享
+            future.set_result(_copy_models_result(result))
+            return result
+        finally:
+            _MODELS_INFLIGHT_ASYNC.pop(key, None)
+    
+    def _models_error_result(self, status_code: int, error_data: Any) -> Dict[str, Any]:
+        """根据错误状态码和响应体构建模型列表的失败结果"""
+        error_msg = f"HTTP {status_code}"
+        if isinstance(error_data, dict) and "error" in error_data:
+            if isinstance(error_data["error"], dict):
+                error_msg = error_data["error"].get("message", error_msg)
+            else:
+                error_msg = str(error_data["error"])
+        
+        return {
+            "success": False,
+            "error": error_msg,
+            "provider": self.config.provider,
+            "status_code": status_code
+        }
+    
+    def _anthropic_models_request(self, limit: Optional[int], page_token: Optional[str],
+                                  kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """构建Anthropic模型列表请求"""
         base_url = self.config.base_url.rstrip('/')
         url = f"{base_url}/v1/models"
         
@@ -799,65 +1483,25 @@ class LLMAPIManager:
             "User-Agent": "ModularFlow-LLM-API/1.0"
         }
         
-        if self.config.enable_logging:
-            logger.info(f"Anthropic获取模型列表: {url}, 参数: {params}")
-        
-        try:
-            response = requests.get(
-                url,
-                headers=headers,
-                params=params,
-                timeout=(self.config.connect_timeout, self.config.timeout)
-            )
-            
-            if not response.ok:
-                error_msg = f"HTTP {response.status_code}"
-                try:
-                    error_data = response.json()
-                    if "error" in error_data:
-                        if isinstance(error_data["error"], dict):
-                            error_msg = error_data["error"].get("message", error_msg)
-                        else:
-                            error_msg = str(error_data["error"])
-                except:
-                    pass
-                
-                return {
-                    "success": False,
-                    "error": error_msg,
-                    "provider": self.config.provider,
-                    "status_code": response.status_code
-                }
-            
-            data = response.json()
-            if self.config.enable_logging:
-                logger.info(f"Anthropic模型列表响应: {json.dumps(data, indent=2, ensure_ascii=False)}")
-            
-            return {
-                "success": True,
-                "provider": self.config.provider,
-                "data": data.get("data", []),
-                "first_id": data.get("first_id"),
-                "last_id": data.get("last_id"),
-                "has_more": data.get("has_more", False),
-                "raw_response": data
-            }
-            
-        except requests.exceptions.Timeout:
-            return {
-                "success": False,
-                "error": "请求超时",
-                "provider": self.config.provider
-            }
-        except requests.exceptions.ConnectionError:
-            return {
-                "success": False,
-                "error": "连接失败",
-                "provider": self.config.provider
-            }
+        if self._verbose():
+            logger.info("Anthropic获取模型列表: %s, 参数: %s", url, params)
+        return url, headers, params
+    
+    def _anthropic_models_result(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """整理Anthropic模型列表响应"""
+        return {
+            "success": True,
+            "provider": self.config.provider,
+            "data": data.get("data", []),
+            "first_id": data.get("first_id"),
+            "last_id": data.get("last_id"),
+            "has_more": data.get("has_more", False),
+            "raw_response": data
+        }
     
-    def _list_gemini_models(self, limit: Optional[int] = None, page_token: Optional[str] = None, **kwargs) -> Dict[str, Any]:
-        """获取Gemini模型列表"""
+    def _gemini_models_request(self, limit: Optional[int], page_token: Optional[str],
+                               kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """构建Gemini模型列表请求"""
         url = "https://generativelanguage.googleapis.com/v1beta/models"
         
         # 构建查询参数
@@ -877,118 +1521,131 @@ class LLMAPIManager:
             "User-Agent": "ModularFlow-LLM-API/1.0"
         }
         
-        if self.config.enable_logging:
-            logger.info(f"Gemini获取模型列表: {url}, 参数: {params}")
+        if self._verbose():
+            logger.info("Gemini获取模型列表: %s, 参数: %s", url, params)
+        return url, headers, params
+    
+    def _gemini_models_result(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """整理Gemini模型列表响应"""
+        return {
+            "success": True,
+            "provider": self.config.provider,
+            "models": data.get("models", []),
+            "next_page_token": data.get("nextPageToken"),
+            "raw_response": data
+        }
+    
+    def _openai_models_request(self, limit: Optional[int], page_token: Optional[str],
+                               kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """构建OpenAI格式的模型列表请求（标准 /models 接口不分页）"""
+        base_url = self.config.base_url.rstrip('/')
+        url = f"{base_url}/models"
+        
+        if self._verbose():
+            logger.info("OpenAI获取模型列表: %s", url)
+        return url, self._get_headers(), {}
+    
+    def _openai_models_result(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """整理OpenAI格式的模型列表响应"""
+        return {
+            "success": True,
+            "provider": self.config.provider,
+            "data": data.get("data", []),
+            "raw_response": data
+        }
+    
+    def _fetch_models(self, limit: Optional[int], page_token: Optional[str], kwargs: Dict[str, Any],
+                      etag: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        同步请求模型列表，请求构建与结果整理使用初始化时绑定的提供商方法
+        
+        传入 etag 时发送 If-None-Match 条件请求。返回 (结果, 响应ETag)，
+        服务端返回 304 未修改时结果为 None。
+        """
+        url, headers, params = self._models_request(limit, page_token, kwargs)
+        if etag:
+            headers = {**headers, "If-None-Match": etag}
         
         try:
-            response = requests.get(
+            response = self._session.get(
                 url,
                 headers=headers,
                 params=params,
                 timeout=(self.config.connect_timeout, self.config.timeout)
             )
             
+            if etag and response.status_code == 304:
+                return None, etag
+            
             if not response.ok:
-                error_msg = f"HTTP {response.status_code}"
                 try:
-                    error_data = response.json()
-                    if "error" in error_data:
-                        if isinstance(error_data["error"], dict):
-                            error_msg = error_data["error"].get("message", error_msg)
-                        else:
-                            error_msg = str(error_data["error"])
-                except:
-                    pass
-                
-                return {
-                    "success": False,
-                    "error": error_msg,
-                    "provider": self.config.provider,
-                    "status_code": response.status_code
-                }
+                    error_data = _loads(response.content)
+                except Exception:
+                    error_data = None
+                return self._models_error_result(response.status_code, error_data), None
             
-            data = response.json()
-            if self.config.enable_logging:
-                logger.info(f"Gemini模型列表响应: {json.dumps(data, indent=2, ensure_ascii=False)}")
+            data = _loads(response.content)
+            if self._verbose():
+                logger.info("%s模型列表响应: %s", self.config.provider, _LazyJSON(data))
             
-            return {
-                "success": True,
-                "provider": self.config.provider,
-                "models": data.get("models", []),
-                "next_page_token": data.get("nextPageToken"),
-                "raw_response": data
-            }
+            return self._models_result(data), response.headers.get("ETag")
             
         except requests.exceptions.Timeout:
             return {
                 "success": False,
                 "error": "请求超时",
                 "provider": self.config.provider
-            }
+            }, None
         except requests.exceptions.ConnectionError:
             return {
                 "success": False,
                 "error": "连接失败",
                 "provider": self.config.provider
-            }
+            }, None
     
-    def _list_openai_models(self, limit: Optional[int] = None, page_token: Optional[str] = None, **kwargs) -> Dict[str, Any]:
-        """获取OpenAI格式的模型列表"""
-        base_url = self.config.base_url.rstrip('/')
-        url = f"{base_url}/models"
-        
-        # 构建请求头
-        headers = self._get_headers()
-        
-        if self.config.enable_logging:
-            logger.info(f"OpenAI获取模型列表: {url}")
+    async def _afetch_models(self, limit: Optional[int], page_token: Optional[str], kwargs: Dict[str, Any],
+                             etag: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """通过共享 aiohttp 会话异步请求模型列表，条件请求与返回值同 _fetch_models"""
+        url, headers, params = self._models_request(limit, page_token, kwargs)
+        if etag:
+            headers = {**headers, "If-None-Match": etag}
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=self.config.connect_timeout,
+            sock_read=self.config.timeout
+        )
         
         try:
-            response = requests.get(
-                url,
-                headers=headers,
-                timeout=(self.config.connect_timeout, self.config.timeout)
-            )
+            async with self._get_aio_session().get(url, headers=headers, params=params, timeout=timeout) as response:
+                status = response.status
+                body = await response.read()
+                response_etag = response.headers.get("ETag")
             
-            if not response.ok:
-                error_msg = f"HTTP {response.status_code}"
+            if etag and status == 304:
+                return None, etag
+            
+            if status >= 400:
                 try:
-                    error_data = response.json()
-                    if "error" in error_data:
-                        if isinstance(error_data["error"], dict):
-                            error_msg = error_data["error"].get("message", error_msg)
-                        else:
-                            error_msg = str(error_data["error"])
-                except:
-                    pass
-                
-                return {
-                    "success": False,
-                    "error": error_msg,
-                    "provider": self.config.provider,
-                    "status_code": response.status_code
-                }
+                    error_data = _loads(body)
+                except Exception:
+                    error_data = None
+                return self._models_error_result(status, error_data), None
             
-            data = response.json()
-            if self.config.enable_logging:
-                logger.info(f"OpenAI模型列表响应: {json.dumps(data, indent=2, ensure_ascii=False)}")
+            data = _loads(body)
+            if self._verbose():
+                logger.info("%s模型列表响应: %s", self.config.provider, _LazyJSON(data))
             
-            return {
-                "success": True,
-                "provider": self.config.provider,
-                "data": data.get("data", []),
-                "raw_response": data
-            }
+            return self._models_result(data), response_etag
             
-        except requests.exceptions.Timeout:
+        except asyncio.TimeoutError:
             return {
                 "success": False,
                 "error": "请求超时",
                 "provider": self.config.provider
-            }
-        except requests.exceptions.ConnectionError:
+            }, None
+        except aiohttp.ClientConnectionError:
             return {
                 "success": False,
                 "error": "连接失败",
                 "provider": self.config.provider
-            }
\ No newline at end of file
+            }, None
\ No newline at end of file
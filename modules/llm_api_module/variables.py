@@ -52,6 +52,30 @@ HTTP_ERROR_MESSAGES = {
 DEFAULT_TIMEOUT = 60  # 默认超时时间(秒)
 DEFAULT_CONNECT_TIMEOUT = 10  # 连接超时时间(秒)
 MAX_REQUEST_SIZE = 1024 * 1024 * 10  # 最大请求大小 (10MB)
+STREAM_CHUNK_SIZE = 65536  # 流式响应单次读取的最大字节数
+
+# 连接池配置（同一管理器的请求复用 TCP/TLS 连接）
+HTTP_POOL_CONNECTIONS = 16  # 缓存的主机连接池数量
+HTTP_POOL_MAXSIZE = 64  # 每个主机保持的最大连接数
+HTTP_MAX_RETRIES = 2  # 连接失败及可重试状态码的重试次数
+HTTP_RETRY_BACKOFF = 0.2  # 重试退避系数(秒)
+HTTP_RETRY_STATUS = [429, 502, 503, 504]  # 可重试的状态码（仅幂等请求）
+AIOHTTP_LIMIT = 100  # 异步连接池总连接数上限
+AIOHTTP_LIMIT_PER_HOST = 32  # 异步连接池每个主机的连接数上限
+AIOHTTP_DNS_CACHE_TTL = 300  # DNS 解析缓存时间(秒)
+AIOHTTP_KEEPALIVE_TIMEOUT = 75  # 空闲连接保持时间(秒)
+HTTPX_MAX_CONNECTIONS = 100  # HTTP/2 客户端的最大连接数
+HTTPX_MAX_KEEPALIVE_CONNECTIONS = 32  # HTTP/2 客户端保持的空闲连接数
+PREWARM_TIMEOUT = 2.0  # 连接预热请求的读取超时(秒)
+BATCH_MAX_CONCURRENCY = 8  # 批量调用的默认并发数
+EXECUTOR_MAX_WORKERS = 64  # call_api_in_pool 共享线程池的最大线程数
+
+# 响应缓存（仅显式 cacheable=True 的非流式调用）
+RESPONSE_CACHE_MAX_ENTRIES = 1024  # 最大缓存条目数
+RESPONSE_CACHE_TTL = 3600  # 缓存有效期(秒)
+
+# 模型列表缓存有效期(秒)，模型目录通常以小时为单位变化
+MODELS_CACHE_TTL = 600
 
 # 日志级别
 DEFAULT_LOG_LEVEL = "WARNING"
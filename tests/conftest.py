@@ -0,0 +1,97 @@
+"""
+测试公共夹具
+
+将仓库根目录加入导入路径，并提供一个模拟 LLM 提供商的本地 HTTP 服务
+（OpenAI 格式的 /chat/completions 与 /models 接口）。
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+class MockProvider:
+    """模拟提供商：记录各接口的请求次数与最近一次的 If-None-Match 头"""
+
+    def __init__(self):
+        self.hits = {"chat": 0, "models": 0}
+        self.if_none_match = []
+        self.etag = '"v1"'
+        self.models_delay = 0.0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def _count(self, name: str):
+        with self._lock:
+            self.hits[name] += 1
+
+    def _handler_class(self):
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code: int, body: bytes, headers=None):
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                provider._count("models")
+                if provider.models_delay:
+                    time.sleep(provider.models_delay)
+                inm = self.headers.get("If-None-Match")
+                provider.if_none_match.append(inm)
+                if inm is not None and inm == provider.etag:
+                    return self._send(304, b"", {"ETag": provider.etag})
+                body = json.dumps({"data": [{"id": "model-a"}, {"id": "model-b"}]}).encode()
+                self._send(200, body, {"ETag": provider.etag})
+
+            def do_POST(self):
+                provider._count("chat")
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length))
+                body = json.dumps({
+                    "choices": [{
+                        "message": {"content": "echo " + request["messages"][-1]["content"]},
+                        "finish_reason": "stop"
+                    }],
+                    "model": request["model"],
+                    "usage": {"total_tokens": 3}
+                }).encode()
+                self._send(200, body)
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def provider():
+    """启动模拟提供商，测试结束后关闭"""
+    server = MockProvider()
+    server.start()
+    yield server
+    server.stop()
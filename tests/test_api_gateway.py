@@ -0,0 +1,310 @@
+"""
+API网关测试
+"""
+
+import asyncio
+import json
+import logging
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from core.api_registry import register_api
+from modules.api_gateway_module import api_gateway_module as gateway_module
+from modules.api_gateway_module import APIGateway, GatewayConfig, Middleware
+from modules.api_gateway_module.api_gateway_module import CoreMiddleware, WebSocketClient, _BatchFrame
+
+logging.getLogger(gateway_module.__name__).setLevel(logging.WARNING)
+
+
+@register_api(name="tests.gateway.echo")
+def echo(text: str, suffix: str = "") -> dict:
+    return {"text": text + suffix}
+
+
+@register_api(name="tests.gateway.thread_name")
+def thread_name() -> dict:
+    return {"thread": threading.current_thread().name}
+
+
+@pytest.fixture(autouse=True)
+def clean_rate_store():
+    """每个测试使用空的限流存储"""
+    for store in Middleware._rate_shards:
+        store.clear()
+    yield
+    for store in Middleware._rate_shards:
+        store.clear()
+
+
+def make_gateway(**overrides) -> APIGateway:
+    """创建不做自动发现的网关，并挂载测试函数端点"""
+    gateway = APIGateway(config=GatewayConfig(auto_discovery=False, **overrides))
+    for path, fn, name in (("/echo", echo, "tests.gateway.echo"),
+                           ("/thread_name", thread_name, "tests.gateway.thread_name")):
+        gateway.router.add_endpoint(path, "GET,POST", gateway._create_function_handler(fn, name), raw=True)
+    gateway._register_endpoints_to_fastapi()
+    return gateway
+
+
+def with_rate_limit(gateway: APIGateway) -> APIGateway:
+    """在应用启动前注册并挂载限流中间件"""
+    gateway.router.add_middleware("rate_limit", Middleware.rate_limit_middleware)
+    gateway._mount_router_middlewares()
+    return gateway
+
+
+# ========== 限流 ==========
+
+def test_rate_hit_counts_within_sliding_window(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(gateway_module.time, "monotonic", lambda: now[0])
+    assert [Middleware._rate_hit("10.0.0.1") for _ in range(3)] == [1, 2, 3]
+    assert Middleware._rate_hit("10.0.0.2") == 1
+
+    # 窗口内的旧桶仍计入，整窗过期后清零
+    now[0] += 30
+    assert Middleware._rate_hit("10.0.0.1") == 4
+    now[0] += 60
+    assert Middleware._rate_hit("10.0.0.1") == 1
+
+
+def test_idle_rate_entries_are_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(gateway_module.time, "monotonic", lambda: now[0])
+    Middleware._rate_hit("10.0.0.1")
+    now[0] += 30
+    Middleware._rate_hit("10.0.0.2")
+
+    now[0] += 40  # 10.0.0.1 的窗口已过期，10.0.0.2 仍在窗口内
+    Middleware._evict_idle_rate_entries()
+    remaining = {ip for store in Middleware._rate_shards for ip in store}
+    assert remaining == {"10.0.0.2"}
+
+
+def test_rate_limit_middleware_rejects_excess_requests():
+    gateway = with_rate_limit(make_gateway())
+    with TestClient(gateway.app) as client:
+        codes = [client.get("/api/health").status_code for _ in range(125)]
+    assert codes.count(200) == 120
+    assert codes[-5:] == [429] * 5
+
+
+def test_rate_evictor_follows_application_lifespan():
+    gateway = with_rate_limit(make_gateway())
+    with TestClient(gateway.app):
+        task = gateway._rate_evict_task
+        assert task is not None and not task.done()
+    assert gateway._rate_evict_task is None
+    assert task.done()
+
+
+def test_rate_evictor_not_started_without_rate_limit():
+    gateway = make_gateway()
+    with TestClient(gateway.app):
+        assert gateway._rate_evict_task is None
+
+
+# ========== 中间件 ==========
+
+async def tag_middleware(request, call_next):
+    response = await call_next(request)
+    response.headers["X-Tag"] = "on"
+    return response
+
+
+def test_router_middleware_mounted_inside_core_middleware():
+    gateway = make_gateway()
+    gateway.router.add_middleware("tag", tag_middleware)
+    gateway.router.add_middleware("cors", tag_middleware)
+    gateway._mount_router_middlewares()
+
+    # CORS 中间件被忽略，自定义中间件位于 CoreMiddleware 内层
+    classes = [m.cls for m in gateway.app.user_middleware]
+    assert classes[:2] == [CoreMiddleware, BaseHTTPMiddleware]
+    assert classes.count(BaseHTTPMiddleware) == 1
+    with TestClient(gateway.app) as client:
+        assert client.get("/api/echo", params={"text": "a"}).headers["X-Tag"] == "on"
+
+
+# ========== 函数调用 ==========
+
+def test_function_call_with_json_and_query():
+    client = TestClient(make_gateway().app)
+    assert client.post("/api/echo", json={"text": "a", "suffix": "b"}).json() == {"text": "ab"}
+    assert client.get("/api/echo", params={"text": "q"}).json() == {"text": "q"}
+
+
+def test_info_counts_endpoints_per_method():
+    client = TestClient(make_gateway().app)
+    # /health、/info 各 1 个方法，两个 GET,POST 函数端点各 2 个
+    assert client.get("/api/info").json()["endpoints"] == 6
+
+
+def test_sync_function_runs_off_the_event_loop():
+    with TestClient(make_gateway().app) as client:
+        # portal.call 在事件循环线程中执行同步函数
+        loop_thread = client.portal.call(lambda: threading.current_thread().name)
+        assert client.get("/api/thread_name").json()["thread"] != loop_thread
+
+
+# ========== 请求体 ==========
+
+def test_invalid_json_body_returns_400():
+    client = TestClient(make_gateway().app)
+    response = client.post("/api/echo", content=b"{bad", headers={"content-type": "application/json"})
+    assert response.status_code == 400
+    assert response.json()["error_code"] == "INVALID_JSON"
+
+
+def test_oversized_json_body_returns_413():
+    client = TestClient(make_gateway(max_body_size=100).app)
+    response = client.post("/api/echo", json={"text": "x" * 200})
+    assert response.status_code == 413
+    assert response.json()["error_code"] == "PAYLOAD_TOO_LARGE"
+
+
+def test_chunked_multipart_body_is_limited_while_streaming():
+    client = TestClient(make_gateway(max_body_size=1000).app)
+    headers = {"content-type": "multipart/form-data; boundary=B"}
+
+    def oversized():
+        yield b'--B\r\nContent-Disposition: form-data; name="text"\r\n\r\n'
+        for _ in range(50):
+            yield b"x" * 100
+        yield b"\r\n--B--\r\n"
+
+    def small():
+        yield b'--B\r\nContent-Disposition: form-data; name="text"\r\n\r\nhi\r\n--B--\r\n'
+
+    # 生成器请求体以分块编码发送，没有 Content-Length
+    response = client.post("/api/echo", content=oversized(), headers=headers)
+    assert response.status_code == 413
+    response = client.post("/api/echo", content=small(), headers=headers)
+    assert response.status_code == 200 and response.json() == {"text": "hi"}
+
+
+# ========== WebSocket ==========
+
+class FakeWebSocket:
+    """记录发送帧的 WebSocket 替身"""
+
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, data: str):
+        self.frames.append(data)
+
+    async def send_bytes(self, data: bytes):
+        self.frames.append(data)
+
+
+def run_writer(gateway: APIGateway, frames, msgpack: bool = False):
+    """将帧放入发送队列，运行写任务直到队列清空，返回实际发送的帧"""
+    async def run():
+        websocket = FakeWebSocket()
+        client = WebSocketClient(websocket, asyncio.Queue(), msgpack=msgpack)
+        for frame in frames:
+            client.queue.put_nowait(frame)
+        task = asyncio.get_running_loop().create_task(gateway._websocket_writer(client))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        return websocket.frames
+
+    return asyncio.run(run())
+
+
+def test_websocket_frames_coalesced_within_window():
+    gateway = make_gateway(websocket_coalesce_ms=20)
+    frames = [json.dumps({"n": i}) for i in range(3)]
+    sent = run_writer(gateway, frames)
+    assert len(sent) == 1
+    assert json.loads(sent[0]) == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+
+def test_websocket_coalescing_flattens_batched_frames():
+    gateway = make_gateway(websocket_coalesce_ms=20)
+    frames = ['{"n":0}', _BatchFrame('[{"n":1},{"n":2}]'), '{"n":3}']
+    sent = run_writer(gateway, frames)
+    assert len(sent) == 1
+    assert json.loads(sent[0]) == [{"n": 0}, {"n": 1}, {"n": 2}, {"n": 3}]
+
+
+def test_batched_broadcasts_are_not_nested_when_coalescing():
+    gateway = make_gateway(websocket_coalesce_ms=30, broadcast_window_ms=10)
+    gateway.setup_websocket()
+    with TestClient(gateway.app) as client:
+        with client.websocket_connect("/ws") as websocket:
+            async def burst():
+                for i in range(3):
+                    await gateway.broadcast_message({"n": i})
+                await asyncio.sleep(0.015)  # 第一个广播窗口已刷新、发送合并窗口仍未结束
+                for i in range(3, 5):
+                    await gateway.broadcast_message({"n": i})
+
+            client.portal.call(burst)
+            received = []
+            # 嵌套数组中的消息也计数，出错时断言失败而不是一直等待
+            while sum(len(m) if isinstance(m, list) else 1 for m in received) < 5:
+                frame = json.loads(websocket.receive_text())
+                received.extend(frame if isinstance(frame, list) else [frame])
+    assert received == [{"n": i} for i in range(5)]
+
+
+def test_websocket_frames_sent_individually_without_window():
+    gateway = make_gateway()
+    frames = [json.dumps({"n": i}) for i in range(3)]
+    assert run_writer(gateway, frames) == frames
+
+
+def test_websocket_binary_frames_never_coalesced():
+    gateway = make_gateway(websocket_coalesce_ms=20)
+    frames = [b"\x81\xa1n\x00", b"\x81\xa1n\x01"]
+    assert run_writer(gateway, frames, msgpack=True) == frames
+
+
+class HandshakeWebSocket:
+    """握手较慢、接受后立即断开的 WebSocket 替身"""
+
+    def __init__(self):
+        self.scope = {}
+        self.accepted = False
+        self.close_code = None
+
+    async def accept(self, subprotocol=None):
+        await asyncio.sleep(0.05)
+        self.accepted = True
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+    async def receive(self):
+        return {"type": "websocket.disconnect", "code": 1000}
+
+
+def test_websocket_connection_limit_counts_pending_handshakes():
+    gateway = make_gateway(websocket_max_connections=1)
+    gateway.setup_websocket()
+    endpoint = next(route.endpoint for route in gateway.app.routes if getattr(route, "path", None) == "/ws")
+
+    async def run():
+        sockets = [HandshakeWebSocket(), HandshakeWebSocket()]
+        await asyncio.gather(*(endpoint(ws) for ws in sockets))
+        return sockets
+
+    first, second = asyncio.run(run())
+    assert first.accepted and not second.accepted
+    assert second.close_code == 1013
+    # 连接结束后名额释放
+    assert gateway._websocket_slots == 0
+
+
+def test_websocket_ping_roundtrip():
+    gateway = make_gateway()
+    gateway.setup_websocket()
+    with TestClient(gateway.app) as client:
+        with client.websocket_connect("/ws") as websocket:
+            websocket.send_text(json.dumps({"type": "ping"}))
+            assert json.loads(websocket.receive_text())["type"] == "pong"
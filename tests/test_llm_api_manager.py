@@ -0,0 +1,179 @@
+"""
+LLM API管理器测试
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from modules.llm_api_module import LLMAPIManager, APIConfiguration, clear_response_cache, get_response_cache_stats
+from modules.llm_api_module import llm_api_manager
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture(autouse=True)
+def clean_caches():
+    """每个测试使用空的进程级缓存"""
+    clear_response_cache()
+    llm_api_manager._MODELS_CACHE.clear()
+    yield
+    clear_response_cache()
+    llm_api_manager._MODELS_CACHE.clear()
+
+
+def make_manager(provider, api_key: str = "test-key") -> LLMAPIManager:
+    return LLMAPIManager(APIConfiguration(
+        provider="openai",
+        api_key=api_key,
+        base_url=provider.base_url,
+        models=["test-model"]
+    ))
+
+
+# ========== 响应缓存 ==========
+
+def test_response_cache_is_opt_in(provider):
+    manager = make_manager(provider)
+    for _ in range(2):
+        assert manager.call_api(MESSAGES, model="test-model", temperature=0).success
+    assert provider.hits["chat"] == 2
+
+    for _ in range(2):
+        response = manager.call_api(MESSAGES, model="test-model", cacheable=True)
+        assert response.success and response.content == "echo hi"
+    assert provider.hits["chat"] == 3
+    assert get_response_cache_stats()["hits"] == 1
+
+
+def test_response_cache_is_isolated_by_api_key(provider):
+    make_manager(provider, "key-a").call_api(MESSAGES, model="test-model", cacheable=True)
+    make_manager(provider, "key-b").call_api(MESSAGES, model="test-model", cacheable=True)
+    assert provider.hits["chat"] == 2
+
+
+def test_response_cache_expires_after_ttl(provider, monkeypatch):
+    monkeypatch.setattr(llm_api_manager.v, "RESPONSE_CACHE_TTL", 0)
+    manager = make_manager(provider)
+    for _ in range(2):
+        manager.call_api(MESSAGES, model="test-model", cacheable=True)
+    assert provider.hits["chat"] == 2
+
+
+def test_response_cache_evicts_least_recently_used(provider, monkeypatch):
+    monkeypatch.setattr(llm_api_manager.v, "RESPONSE_CACHE_MAX_ENTRIES", 2)
+    manager = make_manager(provider)
+    first, second, third = ([{"role": "user", "content": text}] for text in ("a", "b", "c"))
+
+    manager.call_api(first, model="test-model", cacheable=True)
+    manager.call_api(second, model="test-model", cacheable=True)
+    manager.call_api(first, model="test-model", cacheable=True)  # 命中，first 成为最近使用
+    manager.call_api(third, model="test-model", cacheable=True)  # 淘汰 second
+    assert provider.hits["chat"] == 3
+
+    manager.call_api(first, model="test-model", cacheable=True)
+    assert provider.hits["chat"] == 3
+    manager.call_api(second, model="test-model", cacheable=True)
+    assert provider.hits["chat"] == 4
+
+
+def test_async_call_shares_response_cache(provider):
+    manager = make_manager(provider)
+    manager.call_api(MESSAGES, model="test-model", cacheable=True)
+
+    async def call():
+        try:
+            return await manager.acall_api(MESSAGES, model="test-model", cacheable=True)
+        finally:
+            await LLMAPIManager.aclose()
+
+    assert asyncio.run(call()).content == "echo hi"
+    assert provider.hits["chat"] == 1
+
+
+# ========== 模型列表缓存 ==========
+
+def test_models_cached_within_ttl(provider):
+    manager = make_manager(provider)
+    first = manager.list_models()
+    assert first["success"] and [m["id"] for m in first["data"]] == ["model-a", "model-b"]
+
+    second = manager.list_models()
+    assert second == first and second is not first
+    assert provider.hits["models"] == 1
+
+
+def test_cached_models_are_not_shared_with_callers(provider):
+    manager = make_manager(provider)
+    manager.list_models()["data"].clear()
+    manager.list_models()["data"][0]["id"] = "changed"
+
+    assert [m["id"] for m in manager.list_models()["data"]] == ["model-a", "model-b"]
+    assert provider.hits["models"] == 1
+
+
+def test_models_revalidated_with_etag(provider):
+    manager = make_manager(provider)
+    first = manager.list_models()
+
+    refreshed = manager.list_models(force_refresh=True)
+    assert provider.hits["models"] == 2
+    assert provider.if_none_match == [None, '"v1"']
+    assert refreshed["data"] == first["data"]
+
+    # 内容变化后服务端返回新的列表与 ETag
+    provider.etag = '"v2"'
+    assert manager.list_models(force_refresh=True)["success"]
+    assert llm_api_manager._MODELS_CACHE[manager._models_cache_key(None, None, {})][2] == '"v2"'
+
+
+def test_models_expired_entry_revalidated(provider, monkeypatch):
+    manager = make_manager(provider)
+    manager.list_models()
+    monkeypatch.setattr(llm_api_manager.v, "MODELS_CACHE_TTL", 0)
+    assert manager.list_models()["success"]
+    assert provider.if_none_match == [None, '"v1"']
+
+
+def test_models_stale_result_on_connection_failure(provider):
+    make_manager(provider).list_models()
+    provider.stop()
+
+    # 新管理器没有保持中的连接，请求直接连接失败
+    result = make_manager(provider).list_models(force_refresh=True)
+    assert result["success"] and result["stale"] is True
+
+
+# ========== 并发请求合并 ==========
+
+def test_concurrent_model_requests_share_one_fetch(provider):
+    provider.models_delay = 0.3
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(make_manager(provider).list_models()))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 5 and all(r["success"] for r in results)
+    assert len({id(r["data"]) for r in results}) == 5  # 每个调用方拿到独立的副本
+    assert provider.hits["models"] == 1
+
+
+def test_concurrent_async_model_requests_share_one_fetch(provider):
+    provider.models_delay = 0.3
+
+    async def fetch_all():
+        try:
+            return await asyncio.gather(*(make_manager(provider).alist_models() for _ in range(5)))
+        finally:
+            await LLMAPIManager.aclose()
+
+    results = asyncio.run(fetch_all())
+    assert all(r["success"] for r in results)
+    assert len({id(r["data"]) for r in results}) == 5
+    assert provider.hits["models"] == 1
@@ -4,13 +4,30 @@
 
 import os
 import json
+import asyncio
 import base64
+import functools
+import struct
+import zlib
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 
 from modules.SmartTavern.image_binding_module import ImageBindingModule
 from modules.SmartTavern.image_binding_module.variables import FILE_TYPE_TAGS
 
+# 图片/文件读写与PNG解析可能抛出的异常（文件不存在、格式无效、数据截断或解压失败、
+# 参数类型错误，以及绑定数据结构不符时的字段/属性缺失）
+_BINDING_ERRORS = (OSError, ValueError, TypeError, KeyError, AttributeError, struct.error, zlib.error)
+
+async def _run_in_thread(func, *args, **kwargs):
+    """在默认线程池中执行阻塞调用（asyncio.to_thread 需要 Python 3.9+）"""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+@functools.lru_cache(maxsize=4096)
+def _norm_path(path: str) -> str:
+    """规范化路径字符串（结果缓存，重复路径无需再次解析）"""
+    return str(Path(path))
+
 class ImageBindingWorkflow:
     """
     图像绑定工作流，提供将文件嵌入图片和从图片提取文件的功能
@@ -20,10 +37,12 @@ class ImageBindingWorkflow:
         """初始化图像绑定工作流"""
         self.image_binding = ImageBindingModule()
         self.shared_dir = Path("shared/SmartTavern")
+        # 共享目录的绝对路径（计算一次，用于判断输出路径是否位于共享目录内）
+        self._shared_dir_abs = Path(os.path.abspath(self.shared_dir))
         
         # 确保导出目录存在
         self.export_dir = self.shared_dir / "exports"
-        self.export_dir.mkdir(exist_ok=True)
+        self.export_dir.mkdir(parents=True, exist_ok=True)
     
     async def embed_files_to_image(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -51,21 +70,28 @@ class ImageBindingWorkflow:
                 return {"success": False, "message": "缺少文件路径参数"}
             
             # 处理路径
-            image_path = str(Path(image_path))
-            file_paths = [str(Path(path)) for path in file_paths]
+            image_path = _norm_path(image_path)
+            if not os.path.isfile(image_path):
+                return {"success": False, "message": f"嵌入文件失败: 图片不存在: {image_path}"}
+            file_paths = [_norm_path(path) for path in file_paths]
             
             if output_path:
-                output_path = str(Path(output_path))
+                output_path = _norm_path(output_path)
             
-            # 执行嵌入操作
-            result_path = self.image_binding.embed_files_to_image(
+            # 执行嵌入操作（在线程中完成图片与文件读写，不阻塞事件循环）
+            result_path = await _run_in_thread(
+                self.image_binding.embed_files_to_image,
                 image_path=image_path,
                 file_paths=file_paths,
                 output_path=output_path
             )
             
             # 生成相对于共享目录的路径
-            rel_path = os.path.relpath(result_path, start=str(self.shared_dir)) if result_path.startswith(str(self.shared_dir)) else result_path
+            try:
+                rel_path = str(Path(os.path.abspath(result_path)).relative_to(self._shared_dir_abs))
+            except ValueError:
+                # 输出路径不在共享目录内（Path.is_relative_to 需要 Python 3.9+）
+                rel_path = result_path
             
             return {
                 "success": True,
@@ -74,7 +100,7 @@ class ImageBindingWorkflow:
                 "relative_path": rel_path
             }
         
-        except Exception as e:
+        except _BINDING_ERRORS as e:
             return {"success": False, "message": f"嵌入文件失败: {str(e)}"}
     
     async def extract_files_from_image(self, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -100,15 +126,18 @@ class ImageBindingWorkflow:
                 return {"success": False, "message": "缺少图片路径参数"}
             
             # 处理路径
-            image_path = str(Path(image_path))
+            image_path = _norm_path(image_path)
+            if not os.path.isfile(image_path):
+                return {"success": False, "message": f"提取文件失败: 图片不存在: {image_path}"}
             
             if output_dir:
-                output_dir = str(Path(output_dir))
+                output_dir = _norm_path(output_dir)
             else:
                 output_dir = str(self.export_dir)
             
-            # 执行提取操作
-            extracted_files = self.image_binding.extract_files_from_image(
+            # 执行提取操作（在线程中完成，不阻塞事件循环）
+            extracted_files = await _run_in_thread(
+                self.image_binding.extract_files_from_image,
                 image_path=image_path,
                 output_dir=output_dir,
                 filter_types=filter_types
@@ -120,7 +149,7 @@ class ImageBindingWorkflow:
                 "files": extracted_files
             }
         
-        except Exception as e:
+        except _BINDING_ERRORS as e:
             return {"success": False, "message": f"提取文件失败: {str(e)}"}
     
     async def get_embedded_files_info(self, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -142,10 +171,12 @@ class ImageBindingWorkflow:
                 return {"success": False, "message": "缺少图片路径参数"}
             
             # 处理路径
-            image_path = str(Path(image_path))
+            image_path = _norm_path(image_path)
+            if not os.path.isfile(image_path):
+                return {"success": False, "message": f"获取文件信息失败: 图片不存在: {image_path}"}
             
             # 获取文件信息
-            files_info = self.image_binding.get_embedded_files_info(image_path)
+            files_info = await _run_in_thread(self.image_binding.get_embedded_files_info, image_path)
             
             return {
                 "success": True,
@@ -153,7 +184,7 @@ class ImageBindingWorkflow:
                 "files_info": files_info
             }
         
-        except Exception as e:
+        except _BINDING_ERRORS as e:
             return {"success": False, "message": f"获取文件信息失败: {str(e)}"}
     
     async def is_image_with_embedded_files(self, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -175,10 +206,13 @@ class ImageBindingWorkflow:
                 return {"success": False, "message": "缺少图片路径参数"}
             
             # 处理路径
-            image_path = str(Path(image_path))
+            image_path = _norm_path(image_path)
             
-            # 检查图片
-            has_embedded_files = self.image_binding.is_image_with_embedded_files(image_path)
+            # 检查图片（图片不存在时与模块行为一致，视为不包含嵌入文件，无需进入线程池）
+            if os.path.isfile(image_path):
+                has_embedded_files = await _run_in_thread(self.image_binding.is_image_with_embedded_files, image_path)
+            else:
+                has_embedded_files = False
             
             return {
                 "success": True,
@@ -186,7 +220,7 @@ class ImageBindingWorkflow:
                 "message": "图片包含嵌入文件" if has_embedded_files else "图片不包含嵌入文件"
             }
         
-        except Exception as e:
+        except _BINDING_ERRORS as e:
             return {"success": False, "message": f"检查图片失败: {str(e)}"}
     
     async def get_file_type_tags(self, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -196,14 +230,11 @@ class ImageBindingWorkflow:
         Returns:
             包含文件类型标签的字典
         """
-        try:
-            return {
-                "success": True,
-                "file_type_tags": FILE_TYPE_TAGS
-            }
-        
-        except Exception as e:
-            return {"success": False, "message": f"获取文件类型标签失败: {str(e)}"}
+        # 返回新字典，调用方修改结果不会影响全局的 FILE_TYPE_TAGS
+        return {
+            "success": True,
+            "file_type_tags": dict(FILE_TYPE_TAGS)
+        }
     
     async def test_image_binding(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -232,17 +263,17 @@ class ImageBindingWorkflow:
                 ]
             
             # 处理路径
-            image_path = str(Path(image_path))
-            test_files = [str(Path(path)) for path in test_files]
+            image_path = _norm_path(image_path)
+            test_files = [_norm_path(path) for path in test_files]
             
             # 创建测试输出目录
             test_dir = self.shared_dir / "test_image_binding"
-            test_dir.mkdir(exist_ok=True)
+            test_dir.mkdir(parents=True, exist_ok=True)
             
             # 定义测试输出路径
             test_output_image = str(test_dir / "test_embedded.png")
             test_output_dir = str(test_dir / "extracted")
-            Path(test_output_dir).mkdir(exist_ok=True)
+            Path(test_output_dir).mkdir(parents=True, exist_ok=True)
             
             # 测试嵌入功能
             embed_result = await self.embed_files_to_image({
@@ -254,20 +285,20 @@ class ImageBindingWorkflow:
             if not embed_result.get("success"):
                 return embed_result
             
-            # 测试获取文件信息功能
-            info_result = await self.get_embedded_files_info({
-                "image_path": test_output_image
-            })
+            # 测试获取文件信息与提取功能（两者只读取嵌入后的图片，可并发执行）
+            info_result, extract_result = await asyncio.gather(
+                self.get_embedded_files_info({
+                    "image_path": test_output_image
+                }),
+                self.extract_files_from_image({
+                    "image_path": test_output_image,
+                    "output_dir": test_output_dir
+                })
+            )
             
             if not info_result.get("success"):
                 return info_result
             
-            # 测试提取功能
-            extract_result = await self.extract_files_from_image({
-                "image_path": test_output_image,
-                "output_dir": test_output_dir
-            })
-            
             if not extract_result.get("success"):
                 return extract_result
             
@@ -282,5 +313,5 @@ class ImageBindingWorkflow:
                 "test_output_dir": test_output_dir
             }
         
-        except Exception as e:
+        except _BINDING_ERRORS as e:
             return {"success": False, "message": f"测试失败: {str(e)}"}